@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# NOLICENCE.
+"""
+Benchmark the phases of scaffold.py against synthetic skeletons.
+
+A synthetic skeleton of the requested shape is generated in a temporary
+directory and each phase is timed on its own, a number of times:
+ - scan_cold / scan_warm: `scan_skeletons`, without and with an index;
+ - copy / hardlink: copying the skeleton with `copy_skeleton`;
+ - pack_extract: extracting the skeleton's pack;
+ - render: rendering the skeleton templates;
+ - make_structure: the whole structure of a project, with --render;
+ - steps: the bower, virtualenv and git steps, run against local stub
+   executables, so only scaffold.py's own overhead is measured.
+
+The results are printed, or written to --output, as JSON, e.g.:
+
+    $ python benchmarks/bench_scaffold.py --files 5000 --depth 4 \
+        --templated 0.1 --output bench.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import stat
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from shutil import rmtree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+import scaffold  # noqa: E402
+
+
+# Sizes, in bytes, of the files of each class of the size mix
+file_sizes = {'small': 512, 'medium': 16 * 1024, 'large': 512 * 1024}
+
+# Stub executables: they do what scaffold.py expects from them, instantly
+stub_bower = """#!/bin/sh
+echo "bower $*"
+"""
+stub_git = """#!/bin/sh
+mkdir -p "$2/.git"
+echo "Initialized empty Git repository in $2/.git/"
+"""
+stub_python = """#!/bin/sh
+if [ "$1" = "-c" ]; then echo "9.9"; exit 0; fi
+mkdir -p "$3/bin"
+cat > "$3/bin/pip" <<'EOF'
+#!/bin/sh
+if [ "$1" = "wheel" ]; then mkdir -p "$3"; fi
+echo "pip $*"
+EOF
+chmod +x "$3/bin/pip"
+"""
+
+
+def get_arguments(argv):
+    """Parsing the received arguments from command line."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark the phases of scaffold.py.')
+    parser.add_argument('--files', type=int, default=1000,
+                        help='Number of files of the skeleton.')
+    parser.add_argument('--depth', type=int, default=3,
+                        help='Depth of the skeleton directory tree.')
+    parser.add_argument('--fanout', type=int, default=4,
+                        help='Subdirectories per directory.')
+    parser.add_argument('--sizes', default='small=0.8,medium=0.18,large=0.02',
+                        help='Mix of file sizes, as class=ratio pairs of '
+                        'the classes {0}.'.format(', '.join(file_sizes)))
+    parser.add_argument('--templated', type=float, default=0.1,
+                        help='Ratio of the files which are templates.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Times each phase is run.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the skeleton generator.')
+    parser.add_argument('--output',
+                        help='Write the JSON results to this file.')
+    return parser.parse_args(argv[1:])
+
+
+def parse_sizes(sizes):
+    """Parse a size mix such as `small=0.8,large=0.2`."""
+    mix = []
+    for pair in sizes.split(','):
+        name, ratio = pair.split('=')
+        mix.append((file_sizes[name.strip()], float(ratio)))
+    return mix
+
+
+def make_skeleton(root, name, args):
+    """Generate a synthetic skeleton of the requested shape."""
+    rng = random.Random(args.seed)
+    skeleton_dir = os.path.join(root, name)
+    dirs = ['project']
+    level = ['project']
+    for depth in range(args.depth):
+        level = [os.path.join(parent, 'static' if depth == 0 else
+                              'dir{0}'.format(i))
+                 for parent in level for i in range(args.fanout)]
+        dirs.extend(level)
+    for directory in dirs:
+        os.makedirs(os.path.join(skeleton_dir, directory), exist_ok=True)
+    open(os.path.join(skeleton_dir, 'project.prj'), 'w').close()
+    with open(os.path.join(skeleton_dir, 'requirements.txt'), 'w') as fd:
+        fd.write('Flask==0.10.1\n')
+
+    mix = parse_sizes(args.sizes)
+    sizes = [size for size, ratio in mix]
+    weights = [ratio for size, ratio in mix]
+    for i in range(args.files):
+        directory = rng.choice(dirs)
+        size = rng.choices(sizes, weights)[0]
+        if rng.random() < args.templated:
+            path = os.path.join(skeleton_dir, directory,
+                                'file{0}.py{1}'.format(
+                                    i, scaffold.render_suffix))
+            line = '# {{ app_name }} / {{ skeleton }}\n'
+            with open(path, 'w') as fd:
+                fd.write(line * max(1, size // len(line)))
+        else:
+            path = os.path.join(skeleton_dir, directory,
+                                'file{0}.dat'.format(i))
+            with open(path, 'wb') as fd:
+                fd.write(os.urandom(size))
+    return skeleton_dir
+
+
+def make_stubs(bin_dir):
+    """Write the stub executables, returning the stub python version."""
+    os.makedirs(bin_dir)
+    for name, script in (('bower', stub_bower), ('git', stub_git),
+                         ('python9.9', stub_python)):
+        path = os.path.join(bin_dir, name)
+        with open(path, 'w') as fd:
+            fd.write(script)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return '9.9'
+
+
+def summarize(runs):
+    """Statistics of the timings of a phase."""
+    ordered = sorted(runs)
+    return {
+        'runs': runs,
+        'min': ordered[0],
+        'median': ordered[len(ordered) // 2],
+        'max': ordered[-1],
+    }
+
+
+def time_phase(repeat, run, setup=None):
+    """Time `run` `repeat` times, calling `setup` untimed before each."""
+    runs = []
+    for i in range(repeat):
+        state = setup(i) if setup else None
+        with redirect_stdout(io.StringIO()):
+            start = time.time()
+            run(state) if setup else run()
+            runs.append(time.time() - start)
+    return summarize(runs)
+
+
+def main(args):
+    """Build the synthetic skeleton and benchmark every phase."""
+    workdir = tempfile.mkdtemp(prefix='bench-scaffold-')
+    try:
+        skeletons_root = os.path.join(workdir, 'skeletons')
+        out = os.path.join(workdir, 'out')
+        os.makedirs(out)
+        skeleton_dir = make_skeleton(skeletons_root, 'synthetic', args)
+        version = make_stubs(os.path.join(workdir, 'bin'))
+        os.environ['PATH'] = os.pathsep.join(
+            [os.path.join(workdir, 'bin'), os.environ.get('PATH', '')])
+        scaffold.skeletons_root = skeletons_root
+        scaffold.cache_dir = os.path.join(workdir, 'cache')
+        # keep the user's template cache out of it
+        scaffold.template_env.bytecode_cache = \
+            scaffold.BytecodeCache(os.path.join(workdir, 'jinja'))
+        # probing the real interpreters in PATH is not part of the steps
+        scaffold.discover_interpreters()
+
+        def destination(i, phase):
+            return os.path.join(out, '{0}-{1}'.format(phase, i))
+
+        def options(i, **extra):
+            values = dict(appname='app{0}'.format(i), skeleton='synthetic',
+                          path=out, copy_mode='copy', render=True,
+                          workers=scaffold.default_copy_workers, bower=None,
+                          virtualenv='', git=False)
+            values.update(extra)
+            return argparse.Namespace(**values)
+
+        phases = {}
+
+        def scan_cold(i):
+            # only the skeleton index: the interpreters cache stays warm
+            try:
+                os.remove(scaffold.skeleton_index_file())
+            except OSError:
+                pass
+        phases['scan_cold'] = time_phase(
+            args.repeat, lambda state: scaffold.scan_skeletons(), scan_cold)
+        phases['scan_warm'] = time_phase(args.repeat, scaffold.scan_skeletons)
+        index = scaffold.load_skeleton_index()
+
+        for mode, phase in (('copy', 'copy'), ('hardlink', 'hardlink')):
+            phases[phase] = time_phase(
+                args.repeat,
+                lambda i, mode=mode, phase=phase: scaffold.copy_skeleton(
+                    skeleton_dir, destination(i, phase), mode=mode),
+                lambda i: i)
+
+        pack_path = skeleton_dir + scaffold.pack_suffix
+        scaffold.SkeletonPack.build(skeleton_dir, pack_path)
+        pack = scaffold.SkeletonPack(pack_path)
+        phases['pack_extract'] = time_phase(
+            args.repeat,
+            lambda i: pack.extract(destination(i, 'pack')), lambda i: i)
+        os.remove(pack_path)
+
+        plan = scaffold.walk_skeleton(skeleton_dir)
+        renders = scaffold.render_plan(plan[1], [])
+        modes = dict((src, stat.S_IMODE(os.stat(os.path.join(
+            skeleton_dir, src)).st_mode)) for src, dst in renders)
+        context = {'app_name': 'app', 'skeleton': 'project',
+                   'secret_key': 'secret', 'csrf_secret_key': 'secret'}
+
+        def render_setup(i):
+            target = destination(i, 'render')
+            for relpath in plan[0]:
+                os.makedirs(os.path.join(target, relpath), exist_ok=True)
+            return target
+        phases['render'] = time_phase(
+            args.repeat,
+            lambda target: scaffold.render_skeleton(
+                scaffold.skeleton_template_env(skeleton_dir), renders,
+                modes, target, context),
+            render_setup)
+
+        phases['make_structure'] = time_phase(
+            args.repeat,
+            lambda i: scaffold.make_structure(
+                options(i), 'project', skeleton_dir,
+                destination(i, 'structure'), plan),
+            lambda i: i)
+
+        def steps_setup(i):
+            target = destination(i, 'steps')
+            os.makedirs(os.path.join(target, 'project', 'static'))
+            with open(os.path.join(target, 'requirements.txt'), 'w') as fd:
+                fd.write('Flask==0.10.1\n')
+            return target
+        phases['steps'] = time_phase(
+            args.repeat,
+            lambda target: scaffold.run_steps(scaffold.post_scaffold_steps(
+                options(0, bower='jquery bootstrap', virtualenv=version,
+                        git=True), 'project', target)),
+            steps_setup)
+
+        return {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'shape': {
+                'files': index['synthetic']['files'],
+                'bytes': index['synthetic']['size'],
+                'depth': args.depth,
+                'fanout': args.fanout,
+                'sizes': args.sizes,
+                'templated': len(renders),
+                'seed': args.seed,
+            },
+            'repeat': args.repeat,
+            'phases': phases,
+        }
+    finally:
+        rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    args = get_arguments(sys.argv)
+    results = json.dumps(main(args), indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fd:
+            fd.write(results + '\n')
+    else:
+        print(results)
@@ -18,10 +18,23 @@ You just need to:
  - other parameters can be added to scaffold.py such as:
     -v to install a python virtual environment;
     -g to initiate a git repository at te new project's root directory;
-    -b "package1 package2 ..." to install the selected bower packages.
-    To be able to use the -v -g or -b parameters, git, bower ans pyvenv (for
-    python 3.4+) or virtualenv must have been previously installed on the
-    system.
+    -b "package1 package2 ..." to install the selected bower packages;
+    -m copy|reflink|hardlink to choose how the skeleton static assets
+    are copied (reflinks and hardlinks are only used for files inside
+    `static` or `bower_components` directories);
+    -w N to choose the number of threads used to copy files.
+    The requirements of the virtual environment are installed from a local
+    wheelhouse cache, built on the first use; `--prewarm -v X.Y` builds it
+    ahead of time, so later scaffolds do not need the network.
+    To be able to use the -v -g or -b parameters, git, bower and virtualenv
+    (for python 2) must have been previously installed on the system;
+    python 3 virtual environments are created with its venv module.
+    `python scaffold.py pack [skeleton ...]` packs skeletons into single
+    files, which are extracted instead of copied when up to date.
+    `python scaffold.py upgrade path` updates a generated project with the
+    upstream changes of its skeleton, from the manifest written into it.
+    The python versions offered by -v are found in PATH, pyenv and the
+    common installation prefixes, and are cached until those change.
 """
 
 import sys
@@ -29,9 +42,40 @@ import os
 import argparse
 import jinja2
 import codecs
-from subprocess import Popen, PIPE
-from shutil import copytree, copyfile, ignore_patterns
-import ntpath
+import errno
+import hashlib
+import mmap
+import stat
+import struct
+import io
+import json
+import platform
+import glob
+import re
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import (ThreadPoolExecutor, ProcessPoolExecutor,
+                                FIRST_COMPLETED, wait)
+from collections import deque, namedtuple
+from contextlib import redirect_stdout
+from subprocess import Popen, PIPE, STDOUT, TimeoutExpired
+from shutil import copy2, copystat, copyfile, ignore_patterns, rmtree
+from fnmatch import fnmatch
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import toml as tomllib
+    except ImportError:
+        tomllib = None
 
 if sys.version_info < (3, 0):
     from shutilwhich import which
@@ -44,14 +88,310 @@ else:
 cwd = os.getcwd()
 script_dir = os.path.dirname(os.path.realpath(__file__))
 user_home_dir = os.path.expanduser('~')
+# Where the skeletons are looked for
+skeletons_root = os.environ.get('SCAFFOLD_SKELETONS_DIR') or os.path.join(
+    script_dir, 'skeletons')
+# Python executables are looked for in PATH and in these prefixes
+python_prefixes = ['/usr/bin', '/usr/local/bin', '/opt/*/bin',
+                   '/opt/python/*/bin', '~/.pyenv/shims',
+                   '~/.pyenv/versions/*/bin', '~/.local/bin']
+python_name = re.compile(r'^python\d+(\.\d+)?$')
+# Where scaffold.py keeps its caches, such as the wheelhouse
+cache_dir = os.environ.get('SCAFFOLD_CACHE_DIR') or os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(user_home_dir, '.cache'),
+    'flask-scaffold')
 
 # Jinja2 environment and location for the templates for scaffolding
 template_loader = jinja2.FileSystemLoader(
     searchpath=os.path.join(script_dir, 'templates'))
-template_env = jinja2.Environment(loader=template_loader)
+# Compiled templates are cached on disk and shared by every scaffold
+template_cache_dir = os.path.join(cache_dir, 'jinja')
+
+
+class BytecodeCache(jinja2.FileSystemBytecodeCache):
+    """Filesystem bytecode cache, whose files are replaced atomically, as
+    the workers of --batch and --render write them concurrently. Its
+    directory is created on the first write, rather than on import."""
+
+    def dump_bytecode(self, bucket):
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                # created by another worker meanwhile
+                pass
+        fd, path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            bucket.write_bytecode(f)
+        os.rename(path, self._get_cache_filename(bucket))
+
+
+template_env = jinja2.Environment(
+    loader=template_loader,
+    bytecode_cache=BytecodeCache(template_cache_dir))
+# Templates rendered into every new project
+project_templates = ['manage.py.html', 'config.py.html']
+# Jinja environments rendering skeleton files, by skeleton directory
+skeleton_envs = {}
+
+# Skeleton rendering (see --render)
+# Skeleton files with this suffix are rendered, and the suffix stripped
+render_suffix = '.jinja'
+# Skeleton file listing patterns of files rendered in place, one per line
+render_manifest = '.render'
+
+# Manifest written into each generated project (see `upgrade`)
+manifest_name = '.scaffold.json'
+
+# Packed skeletons (see `SkeletonPack`)
+pack_suffix = '.skpack'
+pack_magic = b'SKPACK1\n'
+# Files per batch written by a single thread when extracting a pack
+pack_batch = 64
+
+# Copy engine
+# Files and directories never copied from a skeleton
+skeleton_ignore = ignore_patterns('*.pyc', '*.prj*', render_manifest)
+# Only files under these directories are read-only assets, thus the only
+# ones which may be reflinked or hardlinked instead of copied
+asset_dirs = ('static', 'bower_components')
+copy_modes = ('copy', 'reflink', 'hardlink')
+default_copy_workers = min(32, (os.cpu_count() or 1) * 4)
+# FICLONE ioctl request number (linux/fs.h)
+FICLONE = 0x40049409
+
+CopyStats = namedtuple('CopyStats', ['files', 'bytes', 'linked', 'seconds'])
+
+
+def scan_skeleton(path):
+    """Scan a single skeleton directory, or pack, for its index entry.
+
+    The entry holds the project name (from the .prj file), the number
+    and total size of the files to copy, a hash of their contents, the
+    modification time of every directory, which tells whether the entry
+    is still fresh, the size, modification time and hash of every file
+    (see `verify_skeleton`) and the render manifest, with its size and
+    modification time. The entry of a pack is read from its header.
+    """
+    if path.endswith(pack_suffix):
+        pack = SkeletonPack(path)
+        return {
+            'project': pack.project,
+            'files': len(pack.files),
+            'size': pack.size,
+            'hash': pack.hash,
+            'pack': True,
+            'mtimes': {'.': os.stat(path).st_mtime_ns},
+        }
+    dirs, files = walk_skeleton(path)
+    digests = file_digests(lambda relpath: os.path.join(path, relpath), files)
+    # stat'ed first, so that an edit while it is read is noticed later
+    render_stat = file_stat(os.path.join(path, render_manifest))
+    render = read_render_manifest(path)
+    return {
+        'project': skeleton_project(path),
+        'files': len(files),
+        'size': sum(size for relpath, size in files),
+        'hash': skeleton_hash(files, digests, dirs, render),
+        'mtimes': dict((relpath, os.stat(os.path.join(path, relpath))
+                        .st_mtime_ns) for relpath in ['.'] + dirs),
+        'digests': [[relpath, size, os.stat(os.path.join(path, relpath))
+                     .st_mtime_ns, digests[relpath]]
+                    for relpath, size in files],
+        'render': [render_stat, render],
+    }
+
+
+def file_stat(path):
+    """Size and modification time of a file, None if there is none."""
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return [info.st_size, info.st_mtime_ns]
+
+
+def skeleton_project(path):
+    """Project name of a skeleton directory, from its .prj file."""
+    for entry in os.scandir(path):
+        # if it is a .prj file
+        if entry.name.endswith('.prj') and entry.is_file():
+            return entry.name.split('.')[0]
+
+
+def file_hash(path):
+    """Hash of the contents of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fd:
+        for chunk in iter(lambda: fd.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_digests(locate, files, workers=default_copy_workers):
+    """Hash the contents of many files concurrently.
+
+    `locate` maps each relative path of `files` to its full path.
+    Returns a dictionary of relative path to hash.
+    """
+    names = [relpath for relpath, size in files]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return dict(zip(names, executor.map(
+            lambda relpath: file_hash(locate(relpath)), names)))
+
+
+def skeleton_hash(files, digests, dirs, render):
+    """Hash of the paths and contents of the skeleton files, given the
+    hashes of their contents, of its directories (empty ones are copied
+    too) and of its render patterns (see `read_render_manifest`)."""
+    digest = hashlib.sha256()
+    for relpath, size in files:
+        digest.update(relpath.encode('utf-8') + b'\0' +
+                      digests[relpath].encode('ascii') + b'\0')
+    for relpath in sorted(dirs):
+        digest.update(b'dir\0' + relpath.encode('utf-8') + b'\0')
+    for pattern in render:
+        digest.update(b'render\0' + pattern.encode('utf-8') + b'\0')
+    return digest.hexdigest()
+
+
+def skeleton_is_fresh(path, entry):
+    """Whether no directory of the skeleton changed since it was indexed.
 
+    Only directory modification times are checked, which is enough to
+    list the skeletons, but files edited in place are not noticed: what
+    depends on their contents checks them with `verify_skeleton`.
+    """
+    if 'render' not in entry and not entry.get('pack'):
+        # indexed by an older scaffold.py
+        return False
+    try:
+        return all(os.stat(os.path.join(path, relpath) if relpath != '.'
+                           else path).st_mtime_ns == mtime
+                   for relpath, mtime in entry['mtimes'].items())
+    except (OSError, KeyError):
+        return False
+
+
+def skeleton_index_file(root=None):
+    """Path of the skeleton index of a skeletons directory."""
+    root = os.path.abspath(root or skeletons_root)
+    return os.path.join(cache_dir, 'skeletons-{0}.json'.format(
+        hashlib.sha1(root.encode('utf-8')).hexdigest()[:12]))
+
+
+def load_skeleton_index(root=None):
+    """Load the skeleton index, rescanning only the stale skeletons.
+
+    The index is kept as JSON in the cache directory, one per skeletons
+    directory, and rewritten only when something changed. Skeletons
+    only available as packs (see `SkeletonPack`) are indexed too.
+    """
+    root = os.path.abspath(root or skeletons_root)
+    try:
+        with open(skeleton_index_file(root)) as fd:
+            cached = json.load(fd)
+    except (IOError, ValueError):
+        cached = {}
 
-def scan_skeletons():
+    def refresh(name):
+        path = os.path.join(root, name)
+        if name not in dirs:
+            path += pack_suffix
+        entry = cached.get(name)
+        if entry is not None and skeleton_is_fresh(path, entry):
+            return name, entry, False
+        return name, scan_skeleton(path), True
+
+    dirs = set()
+    packs = set()
+    for entry in os.scandir(root):
+        if entry.is_dir():
+            dirs.add(entry.name)
+        elif entry.name.endswith(pack_suffix):
+            packs.add(entry.name[:-len(pack_suffix)])
+    # skeletons only available as packs are indexed from the packs
+    names = sorted(dirs | packs)
+    # stat'ing (or rescanning) many skeletons on network storage is
+    # dominated by latency, so it is done concurrently
+    with ThreadPoolExecutor(max_workers=default_copy_workers) as executor:
+        refreshed = list(executor.map(refresh, names))
+    index = dict((name, entry) for name, entry, changed in refreshed)
+
+    if set(index) != set(cached) or any(item[2] for item in refreshed):
+        save_skeleton_index(index, root)
+    return index
+
+
+def save_skeleton_index(index, root=None):
+    """Write the skeleton index of a skeletons directory."""
+    index_file = skeleton_index_file(root)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    temp_file = '{0}.{1}'.format(index_file, os.getpid())
+    with open(temp_file, 'w') as fd:
+        json.dump(index, fd, indent=1, sort_keys=True)
+    os.rename(temp_file, index_file)
+
+
+def verify_skeleton(name, index, root=None):
+    """Bring the index entry of a skeleton up to date with its files.
+
+    Every file is stat'ed, and only those whose size or modification
+    time changed since they were indexed are hashed again, so that the
+    entry's hash always matches the skeleton's contents. The render
+    manifest, which is not copied, is stat'ed too and the skeleton
+    rescanned when it changed. The index is saved when it changed.
+    Returns the entry.
+    """
+    root = os.path.abspath(root or skeletons_root)
+    entry = index[name]
+    path = os.path.join(root, name)
+    if entry.get('pack') or not os.path.isdir(path):
+        return entry
+
+    def check(item):
+        relpath, size, mtime, digest = item
+        info = os.stat(os.path.join(path, relpath))
+        if info.st_size != size or info.st_mtime_ns != mtime:
+            digest = file_hash(os.path.join(path, relpath))
+        return [relpath, info.st_size, info.st_mtime_ns, digest]
+
+    try:
+        with ThreadPoolExecutor(
+                max_workers=default_copy_workers) as executor:
+            digests = list(executor.map(check, entry['digests']))
+    except OSError:
+        # removed since the index was loaded
+        digests = None
+    render_stat, render = entry['render']
+    if digests == entry['digests'] and \
+            file_stat(os.path.join(path, render_manifest)) == render_stat:
+        return entry
+    if digests is None or digests == entry['digests']:
+        entry = scan_skeleton(path)
+    else:
+        files = [(relpath, size) for relpath, size, mtime, digest in digests]
+        dirs = [relpath for relpath in entry['mtimes'] if relpath != '.']
+        entry = dict(entry, digests=digests,
+                     size=sum(size for relpath, size in files),
+                     hash=skeleton_hash(files, skeleton_digests(
+                         {'digests': digests}), dirs, render))
+    index[name] = entry
+    save_skeleton_index(index, root)
+    return entry
+
+
+def skeleton_digests(entry):
+    """Hashes of the skeleton files of an index entry, by relative path,
+    if it has them."""
+    if 'digests' not in entry:
+        return None
+    return dict((relpath, digest)
+                for relpath, size, mtime, digest in entry['digests'])
+
+
+def scan_skeletons(index=None):
     """Scan skeletons directory for skelettons to scaffold.
     Each skeleton must have at its root directory a filename
     with .prj extension which will identify the name to give
@@ -60,45 +400,147 @@ def scan_skeletons():
     When scaffold.py finds the .prj file, adds its name, stripped
     of its extension, to the skeletons dictionary as the pair value
     to the skeleton directory name, which is the key.
+
+    The skeletons are read from the skeleton index (see
+    `load_skeleton_index`) instead of being rescanned every time.
     """
-    # Defining the app skeletons
-    # get a list of installed skeletons
-    # as choices to the -s parameter
-    skeletons = {}
-    os.chdir('skeletons')
-    skeletons_list = os.listdir('.')
-    # Scanning for skeletons
-    for skeleton in skeletons_list:
-        project_dir = os.scandir(skeleton)
-        for project_file in project_dir:
-            # if it is a .prj file
-            if project_file.name.endswith('.prj') and project_file.is_file():
-                skeletons[skeleton] = project_file.name.split('.')[0]
-    # Returns to the original directory
-    os.chdir(cwd)
+    if index is None:
+        index = load_skeleton_index()
+    skeletons_list = sorted(index)
+    skeletons = dict((name, entry['project'])
+                     for name, entry in index.items() if entry['project'])
     return skeletons_list, skeletons
 
 
+def skeleton_source(name, index):
+    """Path to scaffold the skeleton from: its directory or its pack.
+
+    The pack is preferred when it holds the same contents as the
+    directory, or when there is no directory. The files of the directory
+    are checked against the index first (see `verify_skeleton`), so a
+    file edited in place is not missed.
+    """
+    directory = os.path.join(skeletons_root, name)
+    pack = directory + pack_suffix
+    entry = verify_skeleton(name, index) if name in index else {}
+    if os.path.isfile(pack):
+        if entry.get('pack') or SkeletonPack(pack).hash == entry.get('hash'):
+            return pack
+    return directory
+
+
+def python_candidates():
+    """Find the python executables in PATH and in the common prefixes.
+
+    Returns their paths, in PATH order first, together with their
+    modification times, which identify them for the interpreters cache.
+    """
+    dirs = os.environ.get('PATH', '').split(os.pathsep)
+    for prefix in python_prefixes:
+        dirs.extend(sorted(glob.glob(os.path.expanduser(prefix))))
+    candidates = []
+    seen = set()
+    for directory in dirs:
+        if not directory or directory in seen or \
+                not os.path.isdir(directory):
+            continue
+        seen.add(directory)
+        for name in sorted(os.listdir(directory)):
+            if not python_name.match(name):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            if os.access(path, os.X_OK):
+                candidates.append((path, mtime))
+    return candidates
+
+
+def probe_python(path):
+    """Ask a python executable for its real major.minor version."""
+    try:
+        process = Popen([path, '-c', 'import sys; '
+                         'print("%d.%d" % sys.version_info[:2])'],
+                        stdout=PIPE, stderr=PIPE,
+                        start_new_session=(os.name == 'posix'))
+    except Exception:
+        return None
+    try:
+        output, error = process.communicate(timeout=10)
+    except TimeoutExpired:
+        # a hung interpreter, and whatever a wrapper script such as a
+        # pyenv shim started, is not left behind, nor a zombie
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+        process.communicate()
+        return None
+    version = output.decode('utf-8', 'replace').strip()
+    if process.returncode or not re.match(r'^\d+\.\d+$', version):
+        return None
+    return version
+
+
+def discover_interpreters():
+    """Discover the python interpreters installed in the system.
+
+    The candidates found by `python_candidates` are probed in parallel
+    and the results are cached, keyed by PATH and the candidates with
+    their modification times, so the probing is only paid again when
+    some interpreter is installed, removed or updated.
+
+    Returns a dictionary of version to executable, where the first
+    executable found in PATH order wins.
+    """
+    candidates = python_candidates()
+    key = hashlib.sha1(json.dumps(
+        [os.environ.get('PATH', ''), candidates]).encode('utf-8')).hexdigest()
+    cache_file = os.path.join(cache_dir, 'interpreters.json')
+    try:
+        with open(cache_file) as fd:
+            cached = json.load(fd)
+        if cached['key'] == key:
+            return cached['interpreters']
+    except (IOError, ValueError, KeyError):
+        pass
+
+    # symlinks such as python3 -> python3.5 are probed once
+    paths = []
+    realpaths = set()
+    for path, mtime in candidates:
+        realpath = os.path.realpath(path)
+        if realpath not in realpaths:
+            realpaths.add(realpath)
+            paths.append(path)
+    with ThreadPoolExecutor(max_workers=default_copy_workers) as executor:
+        versions = list(executor.map(probe_python, paths))
+    interpreters = {}
+    for path, version in zip(paths, versions):
+        if version and version not in interpreters:
+            interpreters[version] = path
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    temp_file = '{0}.{1}'.format(cache_file, os.getpid())
+    with open(temp_file, 'w') as fd:
+        json.dump({'key': key, 'interpreters': interpreters}, fd, indent=1)
+    os.rename(temp_file, cache_file)
+    return interpreters
+
+
 def scan_python_versions():
     """Scan for the python versions existing in the system.
     It will limit the choices of python virtual environments to install.
 
-    It is assumed that the python binayries are in /usr/bin although some
-    systems have them in /usr/local/bin, or in any other place,
-    so we shall get the directory by using `which` to locate
-    those existing in the system.
+    The interpreters are looked for in PATH, in pyenv and in the common
+    installation prefixes, and their real versions are checked (see
+    `discover_interpreters`).
     """
-    # start defining a list of python versions we accept
-    # and then find those existing in the system
-    acceptable_versions = ['python2.7', 'python3.3', 'python3.4', 'python3.5']
-    py_versions_found = []
-    for py_version in acceptable_versions:
-        py_version = which(py_version)
-        if py_version:
-            # we just need the number version, so we strip the rest
-            py_version = ntpath.basename(py_version)[6:]
-            py_versions_found.append(py_version)
-    return py_versions_found
+    return sorted(discover_interpreters(),
+                  key=lambda version: [int(n) for n in version.split('.')])
 
 
 def get_arguments(argv, skeletons_list, python_versions):
@@ -110,7 +552,7 @@ def get_arguments(argv, skeletons_list, python_versions):
     directory in a new directory named from the application name.
     """
     parser = argparse.ArgumentParser(description='Scaffold a Flask Skeleton.')
-    parser.add_argument('appname',
+    parser.add_argument('appname', nargs='?',
                         help='The application name.')
     parser.add_argument('-p', '--path',
                         default=user_home_dir,
@@ -131,23 +573,86 @@ def get_arguments(argv, skeletons_list, python_versions):
                         install any virtual environment.')
     parser.add_argument('-g', '--git', action='store_true',
                         help='Create a git repository for the application.')
+    parser.add_argument('-m', '--copy-mode', choices=copy_modes,
+                        default='copy',
+                        help='How to copy the skeleton\'s static assets: \
+                        `copy`, `reflink` (copy on write clones, where the \
+                        filesystem supports them) or `hardlink`. \
+                        Defaults to `copy`.')
+    parser.add_argument('-w', '--workers', type=int,
+                        default=default_copy_workers,
+                        help='Number of threads used to copy the skeleton.')
+    parser.add_argument('-r', '--render', action='store_true',
+                        help='Render the skeleton files marked as templates \
+                        (named *{0} or listed in the skeleton\'s {1} file) \
+                        with the project\'s context.'.format(
+                            render_suffix, render_manifest))
+    parser.add_argument('-y', '--yes', action='store_true',
+                        help='Do not ask for confirmation.')
+    parser.add_argument('--batch', metavar='MANIFEST',
+                        help='Scaffold all the applications described in \
+                        a JSON or TOML manifest, in parallel, without \
+                        asking for confirmation.')
+    parser.add_argument('-j', '--jobs', type=int,
+                        default=os.cpu_count() or 1,
+                        help='Number of processes used by --batch.')
+    parser.add_argument('--prewarm', action='store_true',
+                        help='Only fill the wheelhouse cache with the \
+                        skeleton\'s requirements for the python version \
+                        given by -v, so later scaffolds install them \
+                        offline.')
     args = parser.parse_args()
+    if args.prewarm and not args.virtualenv:
+        parser.error('--prewarm requires a python version (-v)')
+    if not (args.prewarm or args.batch) and not args.appname:
+        parser.error('the application name is required')
 
     # Variables #
-    fullpath = os.path.join(args.path, args.appname) \
-        if args.path else os.path.join(cwd, args.appname)
+    fullpath = os.path.join(args.path, args.appname or '') \
+        if args.path else os.path.join(cwd, args.appname or '')
     skeleton = args.skeleton if args.skeleton else 'default'
     # skeleton = [key for key in skeletons.keys() if key == args.skeleton][0]
-    skeleton_dir = os.path.join(cwd, 'skeletons', skeleton)
+    skeleton_dir = os.path.join(skeletons_root, skeleton)
 
     return args, skeleton, skeleton_dir, fullpath
 
 
-def generate_brief(args):
+def get_pack_arguments(argv, skeletons_list):
+    """Parsing the arguments of the `pack` command."""
+    parser = argparse.ArgumentParser(
+        prog='scaffold.py pack',
+        description='Pack skeletons into single {0} files, next to their \
+        directories, which are scaffolded faster.'.format(pack_suffix))
+    parser.add_argument('skeletons', nargs='*',
+                        help='The skeletons to pack. If none, all of them.')
+    args = parser.parse_args(argv[2:])
+    for name in args.skeletons:
+        if name not in skeletons_list:
+            parser.error('unknown skeleton: {0}'.format(name))
+    return args
+
+
+def get_upgrade_arguments(argv):
+    """Parsing the arguments of the `upgrade` command."""
+    parser = argparse.ArgumentParser(
+        prog='scaffold.py upgrade',
+        description='Update a generated project with the changes of its \
+        skeleton and templates, leaving the files modified since they \
+        were generated untouched.')
+    parser.add_argument('path', help='The path of the project.')
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help='Only show what would be updated.')
+    return parser.parse_args(argv[2:])
+
+
+def generate_brief(args, skeleton_entry=None):
     """Context dictionary to pass to the scaffold template.
     This will be used for generate a confirmation screen.
     """
+    skeleton_entry = skeleton_entry or {}
     template_ctx = {
+        'skeleton_files': skeleton_entry.get('files'),
+        'skeleton_size': human_size(skeleton_entry.get('size', 0)),
         'pyversion': args.virtualenv,
         'appname': args.appname,
         'bower': args.bower,
@@ -160,21 +665,425 @@ def generate_brief(args):
     return template.render(template_ctx)
 
 
-def make_structure(args, skeleton, skeleton_dir, fullpath):
-    """Process the arguments and scaffold the new application."""
-    # Copy files and folders
-    print('Copying files and folders...')
-    copytree(os.path.join(script_dir, skeleton_dir), fullpath,
-             ignore=ignore_patterns('*.pyc', '*.prj*'))
-    print('Creating the application configuration...')
+def walk_skeleton(source, ignore=skeleton_ignore):
+    """Walk the skeleton directory tree once.
+
+    Returns the directories (parents first) and the files, as tuples
+    of path relative to `source` and size in bytes, which must be
+    copied. The `ignore` callable has the same semantics as the one
+    `shutil.copytree` receives.
+    """
+    dirs = []
+    files = []
+    for root, dirnames, filenames in os.walk(source, followlinks=True):
+        ignored = ignore(root, dirnames + filenames) if ignore else set()
+        dirnames[:] = sorted(name for name in dirnames if name not in ignored)
+        rel_root = os.path.relpath(root, source)
+        for name in dirnames:
+            dirs.append(os.path.normpath(os.path.join(rel_root, name)))
+        for name in sorted(filenames):
+            if name in ignored:
+                continue
+            size = os.stat(os.path.join(root, name)).st_size
+            files.append((os.path.normpath(os.path.join(rel_root, name)), size))
+    return dirs, files
+
+
+def is_asset(relpath):
+    """Whether the skeleton file is a read-only asset."""
+    return any(part in asset_dirs for part in relpath.split(os.sep)[:-1])
+
+
+def reflink(src, dst):
+    """Clone `src` into `dst` sharing its data blocks (copy on write).
+
+    Falls back to a regular copy when the filesystem does not support
+    it, or when source and destination are on different filesystems.
+    """
+    if fcntl is not None:
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            copystat(src, dst)
+            return True
+        except (IOError, OSError):
+            pass
+    copy2(src, dst)
+    return False
+
+
+def hardlink(src, dst):
+    """Hardlink `src` to `dst`, falling back to a regular copy."""
+    try:
+        os.link(src, dst)
+        return True
+    except OSError as error:
+        if error.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK,
+                               errno.ENOTSUP):
+            raise
+    copy2(src, dst)
+    return False
+
+
+def copy_skeleton(source, destination, mode='copy',
+                  workers=default_copy_workers, ignore=skeleton_ignore,
+                  plan=None, exclude=()):
+    """Copy the skeleton at `source` to the `destination` directory.
+
+    It is a replacement for `shutil.copytree` which walks the skeleton
+    only once and copies the files on a pool of threads. With the
+    `reflink` and `hardlink` modes, the assets are cloned or linked
+    instead of copied. As `copytree` does, it fails if the destination
+    already exists.
+
+    A `plan`, as returned by `walk_skeleton`, saves walking the skeleton
+    again when it is copied many times. Files in `exclude` are left out,
+    such as the ones rendered instead (see `render_skeleton`).
+    """
+    start = time.time()
+    dirs, files = plan or walk_skeleton(source, ignore)
+    files = [entry for entry in files if entry[0] not in exclude]
+    os.makedirs(destination)
+    for relpath in dirs:
+        os.mkdir(os.path.join(destination, relpath))
+
+    link = {'reflink': reflink, 'hardlink': hardlink}.get(mode)
+
+    def copy_file(entry):
+        relpath = entry[0]
+        src = os.path.join(source, relpath)
+        dst = os.path.join(destination, relpath)
+        if link is not None and is_asset(relpath):
+            return link(src, dst)
+        copy2(src, dst)
+        return False
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        linked = sum(executor.map(copy_file, files))
+
+    # as copytree, directories get their metadata once their
+    # contents have been copied
+    for relpath in reversed(dirs):
+        copystat(os.path.join(source, relpath),
+                 os.path.join(destination, relpath))
+    copystat(source, destination)
+
+    return CopyStats(files=len(files),
+                     bytes=sum(size for relpath, size in files),
+                     linked=linked,
+                     seconds=time.time() - start)
+
+
+def human_size(size):
+    """Format a size in bytes for humans."""
+    if size < 1024:
+        return '{0} B'.format(size)
+    for unit in ('KB', 'MB', 'GB'):
+        size /= 1024.0
+        if size < 1024 or unit == 'GB':
+            return '{0:.1f} {1}'.format(size, unit)
+
+
+def format_copy_stats(stats):
+    """Summary line of a skeleton copy."""
+    rate = stats.files / stats.seconds if stats.seconds else stats.files
+    summary = 'Copied {0} files ({1}) in {2:.2f}s, {3:.0f} files/s'.format(
+        stats.files, human_size(stats.bytes), stats.seconds, rate)
+    if stats.linked:
+        summary += ' ({0} linked)'.format(stats.linked)
+    return summary
+
+
+class SkeletonPack(object):
+    """A packed skeleton: a single file holding all the skeleton files.
+
+    The file starts with `pack_magic`, the length of a JSON header (8
+    bytes, big endian) and the header, which indexes the directories and
+    files with their modes and times, followed by the files contents.
+    Extracting a pack produces the same tree `copy_skeleton` does, with
+    a fraction of the syscalls and metadata operations.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as fd:
+            if fd.read(len(pack_magic)) != pack_magic:
+                raise ValueError('{0} is not a skeleton pack'.format(path))
+            length = struct.unpack('>Q', fd.read(8))[0]
+            header = json.loads(fd.read(length).decode('utf-8'))
+        self.data_offset = len(pack_magic) + 8 + length
+        self.project = header['project']
+        self.hash = header['hash']
+        self.render = header['render']
+        self.root = header['root']
+        self.dirs = header['dirs']
+        self.files = header['files']
+        # hashes of the files, which older packs do not have
+        self.file_digests = header.get('digests')
+        self.size = sum(entry[2] for entry in self.files)
+        self.entries = dict((entry[0], entry) for entry in self.files)
+
+    @staticmethod
+    def build(skeleton_dir, path):
+        """Pack the skeleton directory into the file at `path`."""
+        dirs, files = walk_skeleton(skeleton_dir)
+
+        def times(relpath):
+            info = os.stat(os.path.join(skeleton_dir, relpath))
+            return [stat.S_IMODE(info.st_mode), info.st_atime_ns,
+                    info.st_mtime_ns]
+
+        offset = 0
+        packed_files = []
+        for relpath, size in files:
+            packed_files.append(
+                [relpath.replace(os.sep, '/'), offset, size] + times(relpath))
+            offset += size
+        digests = file_digests(
+            lambda relpath: os.path.join(skeleton_dir, relpath), files)
+        render = read_render_manifest(skeleton_dir)
+        header = json.dumps({
+            'project': skeleton_project(skeleton_dir),
+            'hash': skeleton_hash(files, digests, dirs, render),
+            'digests': dict((relpath.replace(os.sep, '/'), digest)
+                            for relpath, digest in digests.items()),
+            'render': render,
+            'root': times('.'),
+            'dirs': [[relpath.replace(os.sep, '/')] + times(relpath)
+                     for relpath in dirs],
+            'files': packed_files,
+        }).encode('utf-8')
+
+        temp_file = '{0}.{1}'.format(path, os.getpid())
+        with open(temp_file, 'wb') as fd:
+            fd.write(pack_magic)
+            fd.write(struct.pack('>Q', len(header)))
+            fd.write(header)
+            for relpath, size in files:
+                with open(os.path.join(skeleton_dir, relpath), 'rb') as src:
+                    data = src.read()
+                if len(data) != size:
+                    raise IOError('{0} changed while packing'.format(relpath))
+                fd.write(data)
+        os.rename(temp_file, path)
+
+    def plan(self):
+        """Directories and files, as `walk_skeleton` returns them."""
+        return ([entry[0].replace('/', os.sep) for entry in self.dirs],
+                [(entry[0].replace('/', os.sep), entry[2])
+                 for entry in self.files])
+
+    def read(self, relpath):
+        """Contents of a packed file."""
+        name, offset, size = self.entries[relpath.replace(os.sep, '/')][:3]
+        with open(self.path, 'rb') as fd:
+            fd.seek(self.data_offset + offset)
+            return fd.read(size)
+
+    def digests(self):
+        """Hashes of the contents of the packed files, by relative path."""
+        if self.file_digests is not None:
+            return dict((relpath.replace('/', os.sep), digest)
+                        for relpath, digest in self.file_digests.items())
+        return dict((relpath, hashlib.sha256(self.read(relpath)).hexdigest())
+                    for relpath, size in self.plan()[1])
+
+    def mode(self, relpath):
+        """Permission bits of a packed file."""
+        return self.entries[relpath.replace(os.sep, '/')][3]
+
+    def extract(self, destination, workers=default_copy_workers, exclude=()):
+        """Extract the pack to the `destination` directory.
+
+        The pack is memory-mapped and the files are written in batches,
+        one batch per thread, each file with a single write from the
+        mapping. As `copy_skeleton`, it fails if the destination exists.
+        """
+        start = time.time()
+        exclude = set(relpath.replace(os.sep, '/') for relpath in exclude)
+        files = [entry for entry in self.files if entry[0] not in exclude]
+        os.makedirs(destination)
+        for entry in self.dirs:
+            os.mkdir(os.path.join(destination, entry[0]))
+
+        def write_batch(batch):
+            for name, offset, size, mode, atime, mtime in batch:
+                target = os.path.join(destination, name)
+                begin = self.data_offset + offset
+                out = os.open(target,
+                              os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+                try:
+                    with memoryview(data) as view:
+                        chunk = view[begin:begin + size]
+                        while chunk:
+                            chunk = chunk[os.write(out, chunk):]
+                        chunk.release()
+                    os.fchmod(out, mode)
+                finally:
+                    os.close(out)
+                os.utime(target, ns=(atime, mtime))
+
+        batches = [files[i:i + pack_batch]
+                   for i in range(0, len(files), pack_batch)]
+        with open(self.path, 'rb') as fd:
+            data = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                list(executor.map(write_batch, batches))
+        finally:
+            data.close()
+
+        # as copy_skeleton, directories get their metadata last
+        for name, mode, atime, mtime in reversed(self.dirs):
+            os.chmod(os.path.join(destination, name), mode)
+            os.utime(os.path.join(destination, name), ns=(atime, mtime))
+        os.chmod(destination, self.root[0])
+        os.utime(destination, ns=tuple(self.root[1:]))
+        return CopyStats(files=len(files),
+                         bytes=sum(entry[2] for entry in files),
+                         linked=0,
+                         seconds=time.time() - start)
+
+
+class PackLoader(jinja2.BaseLoader):
+    """Jinja loader of templates from a skeleton pack."""
+
+    def __init__(self, pack):
+        self.pack = pack
+
+    def get_source(self, environment, template):
+        try:
+            source = self.pack.read(template).decode('utf-8')
+        except KeyError:
+            raise jinja2.TemplateNotFound(template)
+        mtime = os.stat(self.pack.path).st_mtime_ns
+        return (source, '{0}/{1}'.format(self.pack.path, template),
+                lambda: os.stat(self.pack.path).st_mtime_ns == mtime)
+
+
+def pack_skeletons(names, index):
+    """Pack the given skeletons next to their directories."""
+    for name in names:
+        skeleton_dir = os.path.join(skeletons_root, name)
+        if not os.path.isdir(skeleton_dir):
+            print('{0} is not a skeleton directory, skipping it.'.format(name))
+            continue
+        start = time.time()
+        SkeletonPack.build(skeleton_dir, skeleton_dir + pack_suffix)
+        print('Packed {0}: {1} files, {2} in {3:.2f}s'.format(
+            name, index[name]['files'], human_size(index[name]['size']),
+            time.time() - start))
+
+
+def read_render_manifest(skeleton_dir):
+    """Patterns of the skeleton files to render in place."""
+    try:
+        with codecs.open(os.path.join(skeleton_dir, render_manifest),
+                         encoding='utf-8') as fd:
+            lines = [line.strip() for line in fd]
+    except IOError:
+        return []
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+def render_plan(files, patterns):
+    """Select the skeleton files to render.
+
+    Those are the files ending with `render_suffix`, which get it
+    stripped, and the ones matching any of the `patterns` of the
+    skeleton's render manifest. Returns (source, destination) pairs of
+    paths relative to the skeleton and the project.
+    """
+    renders = []
+    for relpath, size in files:
+        name = relpath.replace(os.sep, '/')
+        if relpath.endswith(render_suffix):
+            renders.append((relpath, relpath[:-len(render_suffix)]))
+        elif any(fnmatch(name, pattern) for pattern in patterns):
+            renders.append((relpath, relpath))
+    return renders
+
+
+def skeleton_template_env(skeleton_dir, pack=None):
+    """Jinja environment rendering the files of a skeleton, or its pack.
+
+    Environments are kept per skeleton, so templates compile once per
+    process, and share the bytecode cache of `template_env`, so they
+    compile once for all the scaffolds.
+    """
+    if skeleton_dir not in skeleton_envs:
+        skeleton_envs[skeleton_dir] = jinja2.Environment(
+            loader=PackLoader(pack) if pack
+            else jinja2.FileSystemLoader(skeleton_dir),
+            keep_trailing_newline=True,
+            bytecode_cache=template_env.bytecode_cache)
+    return skeleton_envs[skeleton_dir]
+
+
+def render_skeleton(env, renders, modes, destination, template_ctx,
+                    workers=default_copy_workers):
+    """Render the selected skeleton files into the new project.
+
+    Templates are rendered by a pool of threads, each streaming its
+    output to the destination file, which gets the source's mode,
+    found in `modes` by source path.
+    """
+    def render(entry):
+        src, dst = entry
+        template = env.get_template(src.replace(os.sep, '/'))
+        template.stream(template_ctx).dump(
+            os.path.join(destination, dst), encoding='utf-8')
+        os.chmod(os.path.join(destination, dst), modes[src])
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(render, renders))
+
+
+def make_structure(args, project, skeleton_dir, fullpath, plan=None,
+                   digests=None):
+    """Process the arguments and scaffold the new application.
+
+    `project` is the skeleton's project name, `plan` its already walked
+    directories and files (see `walk_skeleton`) and `digests` the hashes
+    of its files (see `skeleton_digests`), if any.
+    `skeleton_dir` may also be a skeleton pack, which is extracted.
+    With --render, the skeleton files marked as templates are rendered
+    with the same context as the project templates.
+    Returns the context the project templates were rendered with.
+    """
+    source = os.path.join(script_dir, skeleton_dir)
+    pack = SkeletonPack(source) if source.endswith(pack_suffix) else None
+    plan = plan or (pack.plan() if pack else walk_skeleton(source))
     secret_key = codecs.encode(os.urandom(64), 'hex').decode('utf-8')
     csrf_secret_key = codecs.encode(os.urandom(64), 'hex').decode('utf-8')
     template_ctx = {
         'secret_key': secret_key,
         'csrf_secret_key': csrf_secret_key,
-        'skeleton': skeletons[skeleton],
+        'skeleton': project,
         'app_name': args.appname,
     }
+    patterns = pack.render if pack else read_render_manifest(source)
+    renders = render_plan(plan[1], patterns) if args.render else []
+    exclude = set(src for src, dst in renders)
+
+    # Copy files and folders
+    print('Copying files and folders...')
+    if pack:
+        stats = pack.extract(fullpath, workers=args.workers, exclude=exclude)
+    else:
+        stats = copy_skeleton(source, fullpath,
+                              mode=args.copy_mode, workers=args.workers,
+                              plan=plan, exclude=exclude)
+    print(format_copy_stats(stats))
+    if renders:
+        start = time.time()
+        modes = dict((src, pack.mode(src) if pack else stat.S_IMODE(
+            os.stat(os.path.join(source, src)).st_mode)) for src in exclude)
+        render_skeleton(skeleton_template_env(source, pack), renders, modes,
+                        fullpath, template_ctx, workers=args.workers)
+        print('Rendered {0} templates in {1:.2f}s'.format(
+            len(renders), time.time() - start))
+    print('Creating the application configuration...')
 
     # Create manage.py
     try:
@@ -188,112 +1097,700 @@ def make_structure(args, skeleton, skeleton_dir, fullpath):
     try:
         template = template_env.get_template('config.py.html')
         with open(os.path.join(
-                fullpath, skeletons[skeleton], 'config.py'), 'w') as fd:
+                fullpath, project, 'config.py'), 'w') as fd:
             fd.write(template.render(template_ctx))
     except FileNotFoundError:
         pass
 
+    write_manifest(fullpath, args, source, plan, template_ctx,
+                   digests=digests)
+    return template_ctx
+
+
+def project_sources(plan, patterns, render, project):
+    """Where each file make_structure writes comes from.
+
+    Returns a dictionary of the files' paths, relative to the project,
+    to a (kind, name) pair: a `skeleton` file copied, a skeleton file
+    rendered (`render`) or a project `template`.
+    """
+    rendered = dict(render_plan(plan[1], patterns)) if render else {}
+    sources = {}
+    for relpath, size in plan[1]:
+        if relpath in rendered:
+            sources[rendered[relpath]] = ('render', relpath)
+        else:
+            sources[relpath] = ('skeleton', relpath)
+    sources['manage.py'] = ('template', 'manage.py.html')
+    sources[os.path.join(project, 'config.py')] = ('template',
+                                                   'config.py.html')
+    return sources
+
+
+def upstream_digests(source, plan, pack=None, digests=None):
+    """Hashes of the skeleton files and of the project templates.
+
+    The skeleton files are only read when `digests`, those of the
+    skeleton index, do not cover them all, nor the pack's header.
+    """
+    if digests is None or any(relpath not in digests
+                              for relpath, size in plan[1]):
+        if pack:
+            digests = pack.digests()
+        else:
+            digests = file_digests(
+                lambda relpath: os.path.join(source, relpath), plan[1])
+    templates = dict((name, file_hash(os.path.join(
+        script_dir, 'templates', name))) for name in project_templates)
+    return digests, templates
+
+
+def manifest_entry(kind, name, digests, templates, path):
+    """Manifest entry of a file written to the project at `path`.
+
+    A copied skeleton file is not read again: it is its source.
+    """
+    info = os.stat(path)
+    return {
+        'kind': kind,
+        'source': name.replace(os.sep, '/'),
+        'upstream': templates[name] if kind == 'template' else digests[name],
+        'written': digests[name] if kind == 'skeleton' else file_hash(path),
+        'size': info.st_size,
+        'mtime': info.st_mtime_ns,
+    }
+
+
+def write_manifest(fullpath, args, source, plan, template_ctx,
+                   entries=None, complete=True, digests=None):
+    """Write the manifest of a generated project.
+
+    It records the skeleton, the context the templates were rendered
+    with (which `upgrade` renders them with again, so it holds the same
+    secrets as config.py) and, for every file scaffold.py wrote, the
+    hash of its upstream source and of what was written, so `upgrade`
+    can tell what changed on either side. An incomplete manifest does
+    not record the skeleton hash, so every file is checked next time.
+    `digests` are the hashes of the skeleton files, if already known.
+    """
+    pack = SkeletonPack(source) if source.endswith(pack_suffix) else None
+    digests, templates = upstream_digests(source, plan, pack, digests)
+    patterns = pack.render if pack else read_render_manifest(source)
+    if entries is None:
+        sources = project_sources(plan, patterns, args.render,
+                                  template_ctx['skeleton'])
+        entries = dict(
+            (relpath.replace(os.sep, '/'), manifest_entry(
+                kind, name, digests, templates,
+                os.path.join(fullpath, relpath)))
+            for relpath, (kind, name) in sources.items()
+            if os.path.isfile(os.path.join(fullpath, relpath)))
+    manifest = {
+        'skeleton': args.skeleton,
+        'skeleton_hash': skeleton_hash(plan[1], digests, plan[0], patterns)
+        if complete else None,
+        'templates': templates if complete else {},
+        'render': bool(args.render),
+        'context': template_ctx,
+        'files': entries,
+    }
+    with open(os.path.join(fullpath, manifest_name), 'w') as fd:
+        json.dump(manifest, fd, indent=1, sort_keys=True)
+
+
+def is_modified(path, entry):
+    """Whether a project file differs from what scaffold.py wrote."""
+    try:
+        info = os.stat(path)
+    except OSError:
+        return True
+    if info.st_size == entry['size'] and info.st_mtime_ns == entry['mtime']:
+        return False
+    return file_hash(path) != entry['written']
+
+
+def upgrade(fullpath, skeleton_index, dry_run=False):
+    """Bring a generated project up to date with its skeleton.
+
+    Only the files whose upstream source changed since they were
+    written, and that the user has not modified, are rewritten; new
+    upstream files are added. When neither the skeleton (by its index
+    hash, once its files are checked, see `verify_skeleton`) nor the
+    project templates changed, nothing else is read.
+    Returns the number of conflicts: files changed on both sides.
+    """
+    start = time.time()
+    with open(os.path.join(fullpath, manifest_name)) as fd:
+        manifest = json.load(fd)
+    name = manifest['skeleton']
+    if name not in skeleton_index:
+        sys.exit('The skeleton {0} was not found.'.format(name))
+    templates = dict((template, file_hash(os.path.join(
+        script_dir, 'templates', template)))
+        for template in project_templates)
+    entry = verify_skeleton(name, skeleton_index)
+    if entry['hash'] == manifest['skeleton_hash'] and \
+            templates == manifest['templates']:
+        print('{0} is up to date ({1:.3f}s).'.format(
+            fullpath, time.time() - start))
+        return 0
+
+    source = skeleton_source(name, skeleton_index)
+    pack = SkeletonPack(source) if source.endswith(pack_suffix) else None
+    plan = pack.plan() if pack else walk_skeleton(source)
+    digests, templates = upstream_digests(source, plan, pack,
+                                          skeleton_digests(entry))
+    patterns = pack.render if pack else read_render_manifest(source)
+    context = manifest['context']
+    sources = project_sources(plan, patterns, manifest['render'],
+                              context['skeleton'])
+    env = skeleton_template_env(source, pack)
+    entries = manifest['files']
+    counts = {'updated': 0, 'added': 0, 'unchanged': 0, 'conflicts': 0}
+
+    for relpath, (kind, source_name) in sorted(sources.items()):
+        key = relpath.replace(os.sep, '/')
+        entry = entries.get(key)
+        upstream = templates[source_name] if kind == 'template' \
+            else digests[source_name]
+        target = os.path.join(fullpath, relpath)
+        if entry and entry['kind'] == kind and entry['upstream'] == upstream:
+            counts['unchanged'] += 1
+            continue
+        if entry and not os.path.exists(target):
+            # removed by the user, who does not want it anymore
+            counts['unchanged'] += 1
+            continue
+        if (entry and is_modified(target, entry)) or \
+                (not entry and os.path.exists(target)):
+            if kind == 'skeleton' and file_hash(target) == upstream:
+                # the user already made the same change
+                entries[key] = manifest_entry(kind, source_name, digests,
+                                              templates, target)
+                counts['unchanged'] += 1
+                continue
+            print('Conflict, left untouched:', relpath)
+            counts['conflicts'] += 1
+            continue
+        action = 'updated' if entry else 'added'
+        print('{0}: {1}'.format(action.capitalize(), relpath))
+        counts[action] += 1
+        if dry_run:
+            continue
+
+        parent = os.path.dirname(target)
+        if parent and not os.path.isdir(parent):
+            os.makedirs(parent)
+        if kind == 'template':
+            with open(target, 'w') as fd:
+                fd.write(template_env.get_template(source_name)
+                         .render(context))
+        elif kind == 'render':
+            env.get_template(source_name.replace(os.sep, '/')).stream(
+                context).dump(target, encoding='utf-8')
+            os.chmod(target, pack.mode(source_name) if pack else stat.S_IMODE(
+                os.stat(os.path.join(source, source_name)).st_mode))
+        elif pack:
+            with open(target, 'wb') as fd:
+                fd.write(pack.read(source_name))
+            os.chmod(target, pack.mode(source_name))
+        else:
+            copy2(os.path.join(source, source_name), target)
+        entries[key] = manifest_entry(kind, source_name, digests, templates,
+                                      target)
+
+    for key in sorted(set(entries) - set(relpath.replace(os.sep, '/')
+                                         for relpath in sources)):
+        print('Removed upstream, left in place:', key)
+    if not dry_run:
+        # the conflicting files keep their old entries, so they are
+        # reported again until they are resolved
+        args = argparse.Namespace(skeleton=name, render=manifest['render'])
+        write_manifest(fullpath, args, source, plan, context, entries,
+                       complete=not counts['conflicts'], digests=digests)
+    print('{updated} updated, {added} added, {unchanged} unchanged, '
+          '{conflicts} conflicts'.format(**counts),
+          '({0:.3f}s).'.format(time.time() - start))
+    return counts['conflicts']
+
 
-def add_bower(bower, skeleton, fullpath):
-    """Install the selected bower dependencies."""
+class Step(object):
+    """A post-scaffold step.
+
+    Its commands run one after the other and the step only starts
+    once all the steps it `requires` have succeeded. The optional
+    `callback` is called after the last command has succeeded, and the
+    optional `cleanup` when the step has failed instead.
+    """
+
+    def __init__(self, name, commands, requires=(), cwd=None, callback=None,
+                 cleanup=None):
+        self.name = name
+        self.commands = commands
+        self.requires = tuple(requires)
+        self.cwd = cwd
+        self.callback = callback
+        self.cleanup = cleanup
+
+
+StepResult = namedtuple('StepResult',
+                        ['name', 'status', 'seconds', 'returncode', 'output'])
+
+print_lock = threading.Lock()
+
+
+def log_step(name, line):
+    """Print a line of a step's output, prefixed by the step name."""
+    with print_lock:
+        print('[{0}] {1}'.format(name, line))
+        sys.stdout.flush()
+
+
+def run_step(step):
+    """Run the commands of a step, streaming their output as it comes."""
+    start = time.time()
+    output = deque(maxlen=50)  # keep the tail for the failure report
+    returncode = 0
+    succeeded = False
+    try:
+        for command in step.commands:
+            try:
+                process = Popen(command, stdout=PIPE, stderr=STDOUT,
+                                cwd=step.cwd)
+            except OSError as error:
+                output.append('{0}: {1}'.format(command[0], error))
+                returncode = error.errno or 1
+                break
+            for line in iter(process.stdout.readline, b''):
+                line = line.decode('utf-8', 'replace').rstrip()
+                output.append(line)
+                log_step(step.name, line)
+            process.stdout.close()
+            returncode = process.wait()
+            if returncode:
+                break
+        if not returncode and step.callback:
+            step.callback()
+        succeeded = not returncode
+    finally:
+        if not succeeded and step.cleanup:
+            step.cleanup()
+    return StepResult(name=step.name,
+                      status='failed' if returncode else 'ok',
+                      seconds=time.time() - start,
+                      returncode=returncode,
+                      output=list(output))
+
+
+def run_steps(steps):
+    """Run the post-scaffold steps concurrently, as soon as the steps
+    they require have succeeded.
+
+    Steps whose requirements have failed are skipped. Returns the
+    results of all the steps, in the order they were given.
+    """
+    names = set(step.name for step in steps)
+    pending = list(steps)
+    results = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(steps))) as executor:
+        while pending or running:
+            for step in list(pending):
+                requires = [name for name in step.requires if name in names]
+                if any(name in results and results[name].status != 'ok'
+                       for name in requires):
+                    pending.remove(step)
+                    results[step.name] = StepResult(step.name, 'skipped',
+                                                    0.0, None, [])
+                elif all(name in results for name in requires):
+                    pending.remove(step)
+                    log_step(step.name, 'started')
+                    running[executor.submit(run_step, step)] = step
+            if not running:
+                # whatever is still pending can never run
+                for step in pending:
+                    results[step.name] = StepResult(step.name, 'skipped',
+                                                    0.0, None, [])
+                pending = []
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as error:
+                    result = StepResult(step.name, 'failed', 0.0, None,
+                                        [repr(error)])
+                log_step(step.name, '{0} in {1:.2f}s'.format(
+                    result.status, result.seconds))
+                results[step.name] = result
+    return [results[step.name] for step in steps]
+
+
+def steps_report(results):
+    """Timings of every step, followed by the output of the failed ones."""
+    lines = ['{0:<16}{1:<10}{2}'.format('Step', 'Status', 'Time')]
+    for result in results:
+        lines.append('{0:<16}{1:<10}{2:.2f}s'.format(
+            result.name, result.status, result.seconds))
+    for result in results:
+        if result.status == 'failed':
+            lines.append('')
+            lines.append('--- {0} failed (exit code {1}) ---'.format(
+                result.name, result.returncode))
+            lines.extend(result.output)
+        elif result.status == 'skipped':
+            lines.append('')
+            lines.append('--- {0} skipped: a required step failed ---'.format(
+                result.name))
+    return '\n'.join(lines)
+
+
+def add_bower(bower, project, fullpath):
+    """Step installing the selected bower dependencies.
+
+    All the dependencies are installed by a single bower invocation.
+    """
     bower_exe = which('bower')
     if bower_exe:
-        os.chdir(os.path.join(fullpath, skeletons[skeleton], 'static'))
-
-        for dependency in bower:
-            output, error = Popen(
-                [bower_exe, 'install', dependency],
-                stdout=PIPE,
-                stderr=PIPE
-            ).communicate()
-            if error:
-                print('An error occurred with Bower!')
-                print(error)
-    else:
-        print('Could not find bower. '
-              'Ignoring the request for bower '
-              'dependencies installation...')
+        return Step('bower', [[bower_exe, 'install'] + bower],
+                    cwd=os.path.join(fullpath, project, 'static'))
+    print('Could not find bower. '
+          'Ignoring the request for bower '
+          'dependencies installation...')
+
 
+def wheelhouse_dir(version, requirements):
+    """Wheelhouse directory for a python version and a requirements file.
+
+    The wheelhouse is keyed by the python version, the machine and a
+    hash of the requirements, so any change to the pinned packages
+    gets a new wheelhouse.
+    """
+    with open(requirements, 'rb') as fd:
+        lines = set(line.strip() for line in fd.read().splitlines())
+    lines = sorted(line for line in lines
+                   if line and not line.startswith(b'#'))
+    digest = hashlib.sha256(b'\n'.join(lines)).hexdigest()[:16]
+    return os.path.join(cache_dir, 'wheelhouse',
+                        'py{0}-{1}'.format(version, platform.machine()),
+                        digest)
+
+
+def publish_wheelhouse(building, wheelhouse):
+    """Move a freshly built wheelhouse into place."""
+    try:
+        os.rename(building, wheelhouse)
+    except OSError:
+        # another scaffold has just published the same wheelhouse
+        rmtree(building, ignore_errors=True)
+
+
+def wheelhouse_steps(venv_bin, version, requirements, install=True):
+    """Steps building the wheelhouse, if it does not exist yet, and
+    installing the requirements from it without accessing the network.
+    """
+    pip = os.path.join(venv_bin, 'pip')
+    wheelhouse = wheelhouse_dir(version, requirements)
+    steps = []
+    if not os.path.isdir(wheelhouse):
+        building = '{0}.building-{1}'.format(wheelhouse, os.getpid())
+        steps.append(Step(
+            'wheelhouse',
+            [[pip, 'install', 'wheel'],
+             [pip, 'wheel', '--wheel-dir', building, '-r', requirements]],
+            requires=['virtualenv'],
+            callback=lambda: publish_wheelhouse(building, wheelhouse),
+            # a failed build is not kept in the cache
+            cleanup=lambda: rmtree(building, ignore_errors=True)))
+    if install:
+        steps.append(Step(
+            'requirements',
+            [[pip, 'install', '--no-index', '--find-links', wheelhouse,
+              '-r', requirements]],
+            requires=['virtualenv', 'wheelhouse']))
+    return steps
 
-def add_virtualenv(fullpath):
-    """Create a python virtual environment named flask."""
-    if args.virtualenv == "2.7" or args.virtualenv == "3.3":
-        virtualenv_exe = which(''.join(['virtualenv-', args.virtualenv]))
+
+def add_virtualenv(version, fullpath, install=True):
+    """Steps creating a python virtual environment named flask and
+    installing the application requirements in it.
+
+    Python 3 environments are created with the interpreter's own venv
+    module, python 2 ones with virtualenv.
+
+    The requirements are installed from the local wheelhouse cache,
+    which is built first when needed. With `install` false, only the
+    wheelhouse is built (see --prewarm).
+    """
+    python_exe = discover_interpreters().get(version)
+    venv_dir = os.path.join(fullpath, 'flask')
+    if python_exe and not version.startswith('2.'):
+        command = [python_exe, '-m', 'venv', venv_dir]
+    elif python_exe and which('virtualenv'):
+        command = [which('virtualenv'), '-p', python_exe, venv_dir]
     else:
-        virtualenv_exe = which(''.join(['pyvenv-', args.virtualenv]))
-    if virtualenv_exe:
-        output, error = Popen(
-            [virtualenv_exe, os.path.join(fullpath, 'flask')],
-            stdout=PIPE,
-            stderr=PIPE
-        ).communicate()
-
-        if error:
-            with open('virtualenv_error.log', 'w') as fd:
-                fd.write(error.decode('utf-8'))
-                print('An error occurred with virtualenv!')
-                sys.exit(2)
-
-        venv_bin = os.path.join(fullpath, 'flask/bin')
-        print('Adding application requirements...')
-        output, error = Popen(
-            [
-                os.path.join(venv_bin, 'pip'),
-                'install',
-                '-r',
-                os.path.join(fullpath, 'requirements.txt')
-            ],
-            stdout=PIPE,
-            stderr=PIPE
-        ).communicate()
-        if error:
-            with open('pip_error.log', 'w') as fd:
-                fd.write(error.decode('utf-8'))
-                sys.exit(2)
+        command = None
+    if command:
+        venv_bin = os.path.join(venv_dir, 'bin')
+        steps = [Step('virtualenv', [command])]
+        requirements = os.path.join(fullpath, 'requirements.txt')
+        if os.path.isfile(requirements):
+            steps.extend(
+                wheelhouse_steps(venv_bin, version, requirements, install))
+        return steps
+    print('Could not find a valid virtualenv executable. '
+          'Ignoring the request for installing a '
+          'virtual environment...')
+    return []
+
+
+def prewarm(version, skeleton_dir):
+    """Fill the wheelhouse for the skeleton's requirements ahead of time.
+
+    A throwaway virtual environment is used to build the wheels.
+    """
+    workdir = tempfile.mkdtemp(prefix='flask-scaffold-')
+    requirements = os.path.join(workdir, 'requirements.txt')
+    if skeleton_dir.endswith(pack_suffix):
+        with open(requirements, 'wb') as fd:
+            fd.write(SkeletonPack(skeleton_dir).read('requirements.txt'))
     else:
-        print('Could not find a valid virtualenv executable. '
-              'Ignoring the request for installing a '
-              'virtual environment...')
+        copyfile(os.path.join(skeleton_dir, 'requirements.txt'),
+                 requirements)
+    wheelhouse = wheelhouse_dir(version, requirements)
+    if os.path.isdir(wheelhouse):
+        rmtree(workdir, ignore_errors=True)
+        print('The wheelhouse is already warm:', wheelhouse)
+        return 0
+    try:
+        steps = add_virtualenv(version, workdir, install=False)
+        if not steps:
+            return 2
+        results = run_steps(steps)
+    finally:
+        rmtree(workdir, ignore_errors=True)
+    print('\n' + steps_report(results))
+    if any(result.status != 'ok' for result in results):
+        return 2
+    print('\nThe wheelhouse is ready:', wheelhouse)
+    return 0
 
 
 def add_git(fullpath):
-    """Create a git repository at the project's root directory."""
+    """Step creating a git repository at the project's root directory."""
     git_exe = which('git')
     if git_exe:
-        output, error = Popen(
-            ['git', 'init', fullpath],
-            stdout=PIPE,
-            stderr=PIPE
-        ).communicate()
-
-        if error:
-            with open('git_error.log', 'w') as fd:
-                fd.write(error.decode('utf-8'))
-                print('Error with git init!')
-                sys.exit(2)
-        print('Adding a `.gitignore` file...')
-        copyfile(
-            os.path.join(script_dir, 'templates', '.gitignore'),
-            os.path.join(fullpath, '.gitignore')
-        )
+        def add_gitignore():
+            log_step('git', 'Adding a `.gitignore` file...')
+            copyfile(
+                os.path.join(script_dir, 'templates', '.gitignore'),
+                os.path.join(fullpath, '.gitignore')
+            )
+        return Step('git', [[git_exe, 'init', fullpath]],
+                    callback=add_gitignore)
+    print('Could not find git. '
+          'Ignoring the request for initializing '
+          'a `.git` repository...')
+
+
+def post_scaffold_steps(args, project, fullpath):
+    """The bower, virtualenv and git steps requested by the arguments."""
+    steps = []
+    # Add bower dependencies
+    if args.bower:
+        steps.append(add_bower(args.bower.split(), project, fullpath))
+    # Add a python virtual environment
+    if args.virtualenv:
+        steps.extend(add_virtualenv(args.virtualenv, fullpath))
+    # Add a git repository
+    if args.git:
+        steps.append(add_git(fullpath))
+    return [step for step in steps if step]
+
+
+def load_manifest(path, args):
+    """Load the projects of a batch manifest, JSON or TOML.
+
+    The manifest holds a `projects` list, each project with an `appname`
+    and optionally a `skeleton`, `path`, `bower`, `virtualenv`, `git` and
+    `copy_mode` or `render`, and an optional `defaults` table applied to every
+    project. A JSON manifest may also just be the list of projects.
+    Returns the options of each project, as parsed arguments would be.
+    """
+    if path.endswith('.toml'):
+        if tomllib is None:
+            sys.exit('Reading a TOML manifest requires python 3.11+ '
+                     'or the toml package.')
+        with open(path, 'rb') as fd:
+            manifest = tomllib.loads(fd.read().decode('utf-8'))
     else:
-        print('Could not find git. '
-              'Ignoring the request for initializing '
-              'a `.git` repository...')
+        with open(path) as fd:
+            manifest = json.load(fd)
+    if isinstance(manifest, list):
+        manifest = {'projects': manifest}
+
+    defaults = {
+        'path': args.path,
+        'skeleton': 'default',
+        'bower': None,
+        'virtualenv': '',
+        'git': False,
+        'copy_mode': args.copy_mode,
+        'workers': args.workers,
+        'render': args.render,
+    }
+    defaults.update(manifest.get('defaults', {}))
+    projects = []
+    for entry in manifest.get('projects', []):
+        options = dict(defaults, **entry)
+        if not options.get('appname'):
+            sys.exit('Every project in {0} needs an appname.'.format(path))
+        if isinstance(options['bower'], list):
+            options['bower'] = ' '.join(options['bower'])
+        projects.append(argparse.Namespace(**options))
+    return projects
+
+
+def scaffold_project(args, project, skeleton_dir, plan, digests=None):
+    """Scaffold one project of a batch, in a worker process.
+
+    The output is captured instead of printed, and returned with the
+    timings of every phase.
+    """
+    fullpath = os.path.join(args.path, args.appname)
+    output = io.StringIO()
+    timings = {'structure': 0.0, 'steps': 0.0}
+    status = 'ok'
+    start = time.time()
+    with redirect_stdout(output):
+        try:
+            make_structure(args, project, skeleton_dir, fullpath, plan,
+                           digests)
+            timings['structure'] = time.time() - start
+            steps = post_scaffold_steps(args, project, fullpath)
+            if steps:
+                results = run_steps(steps)
+                print(steps_report(results))
+                if any(result.status != 'ok' for result in results):
+                    status = 'failed'
+            timings['steps'] = time.time() - start - timings['structure']
+        except Exception as error:
+            print('{0}: {1}'.format(type(error).__name__, error))
+            status = 'failed'
+    timings['total'] = time.time() - start
+    return {'appname': args.appname, 'skeleton': args.skeleton,
+            'status': status, 'timings': timings,
+            'output': output.getvalue()}
+
+
+def batch_report(results):
+    """Summary table of a batch, and the output of the failed projects."""
+    lines = ['{0:<24}{1:<14}{2:<8}{3:>10}{4:>10}{5:>10}'.format(
+        'Application', 'Skeleton', 'Status', 'Structure', 'Steps', 'Total')]
+    for result in results:
+        timings = result['timings']
+        lines.append(
+            '{0:<24}{1:<14}{2:<8}{3:>9.2f}s{4:>9.2f}s{5:>9.2f}s'.format(
+                result['appname'], result['skeleton'], result['status'],
+                timings['structure'], timings['steps'], timings['total']))
+    for result in results:
+        if result['status'] != 'ok':
+            lines.append('')
+            lines.append('--- {0} failed ---'.format(result['appname']))
+            lines.append(result['output'].rstrip())
+    return '\n'.join(lines)
+
+
+def run_batch(manifest, args, skeleton_index, python_versions):
+    """Scaffold every project of a manifest on a pool of processes.
+
+    The work shared by the projects is done once, up front: each
+    skeleton is walked once, the project templates are compiled into
+    the bytecode cache and the wheelhouses are filled, so the workers
+    only copy, render and install.
+    """
+    start = time.time()
+    projects = load_manifest(manifest, args)
+    skeletons = dict((name, entry['project'])
+                     for name, entry in skeleton_index.items()
+                     if entry['project'])
+    for options in projects:
+        if options.skeleton not in skeletons:
+            sys.exit('Unknown skeleton {0} for {1}.'.format(
+                options.skeleton, options.appname))
+        if options.virtualenv and options.virtualenv not in python_versions:
+            sys.exit('Python {0} for {1} was not found.'.format(
+                options.virtualenv, options.appname))
+        if os.path.exists(os.path.join(options.path, options.appname)):
+            sys.exit('{0} already exists.'.format(
+                os.path.join(options.path, options.appname)))
+
+    used = sorted(set(options.skeleton for options in projects))
+    print('Walking the skeletons:', ', '.join(used))
+    sources = dict((name, skeleton_source(name, skeleton_index))
+                   for name in used)
+    plans = dict((name, SkeletonPack(source).plan()
+                  if source.endswith(pack_suffix) else walk_skeleton(source))
+                 for name, source in sources.items())
+    for name in project_templates:
+        template_env.get_template(name)
+    for version, name in sorted(set((options.virtualenv, options.skeleton)
+                                    for options in projects
+                                    if options.virtualenv)):
+        print('Preparing the python', version, 'wheelhouse for', name)
+        if prewarm(version, sources[name]):
+            print('Could not fill the wheelhouse, the projects '
+                  'will try to build it themselves.')
+
+    print('Scaffolding {0} applications on {1} processes...'.format(
+        len(projects), args.jobs))
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = [executor.submit(
+            scaffold_project, options, skeletons[options.skeleton],
+            sources[options.skeleton], plans[options.skeleton],
+            skeleton_digests(skeleton_index[options.skeleton]))
+            for options in projects]
+        results = []
+        for future in futures:
+            result = future.result()
+            print('{0}: {1} in {2:.2f}s'.format(
+                result['appname'], result['status'],
+                result['timings']['total']))
+            results.append(result)
+    print('\n' + batch_report(results))
+    print('\n{0} applications in {1:.2f}s'.format(
+        len(results), time.time() - start))
+    return 2 if any(result['status'] != 'ok' for result in results) else 0
 
 
 if __name__ == '__main__':
+    # Scan for existing skeletons
+    skeleton_index = load_skeleton_index()
+    skeletons_list, skeletons = scan_skeletons(skeleton_index)
+    if sys.argv[1:2] == ['pack']:
+        pack_args = get_pack_arguments(sys.argv, skeletons_list)
+        pack_skeletons(pack_args.skeletons or skeletons_list, skeleton_index)
+        sys.exit(0)
+    if sys.argv[1:2] == ['upgrade']:
+        upgrade_args = get_upgrade_arguments(sys.argv)
+        sys.exit(1 if upgrade(os.path.abspath(upgrade_args.path),
+                              skeleton_index, upgrade_args.dry_run) else 0)
     # scan for existing python versions in the system
     python_versions = scan_python_versions()
-    # Scan for existing skeletons
-    skeletons_list, skeletons = scan_skeletons()
     # parse the arguments
     args, skeleton, skeleton_dir, fullpath = \
         get_arguments(sys.argv, skeletons_list, python_versions)
+    if skeleton in skeleton_index:
+        skeleton_dir = skeleton_source(skeleton, skeleton_index)
+    if args.prewarm:
+        sys.exit(prewarm(args.virtualenv, skeleton_dir))
+    if args.batch:
+        sys.exit(run_batch(args.batch, args, skeleton_index, python_versions))
     # generate the confirmation screen
-    print(generate_brief(args))
+    print(generate_brief(args, skeleton_index.get(skeleton)))
     # proceed (or not) with the Scaffolding
-    proceed = input('\nProceed (yes/no)? ')
+    proceed = 'yes' if args.yes else input('\nProceed (yes/no)? ')
     valid = ['yes', 'y', 'no', 'n']
 
     while True:
@@ -304,25 +1801,25 @@ if __name__ == '__main__':
 
                 # create new project's structure and configuration files
                 template_ctx = make_structure(
-                    args, skeleton, skeleton_dir, fullpath)
-
-                # Add bower dependencies
-                if args.bower:
-                    bower = args.bower.split(' ')
-                    print('Installing bower dependencies...')
-                    add_bower(bower, skeleton, fullpath)
-
-                # Add a python virtual environment
-                virtualenv = args.virtualenv
-                if virtualenv:
-                    print('Setting up a Python', args.virtualenv,
-                          'virtual environment...')
-                    add_virtualenv(fullpath)
-
-                # Add a git repository
-                if args.git:
-                    print('Initializing a Git repository...')
-                    add_git(fullpath)
+                    args, skeletons[skeleton], skeleton_dir, fullpath,
+                    digests=skeleton_digests(
+                        skeleton_index.get(skeleton, {})))
+
+                # Post-scaffold steps, run concurrently
+                steps = post_scaffold_steps(args, skeletons[skeleton],
+                                            fullpath)
+                if steps:
+                    print('Running', ', '.join(step.name for step in steps),
+                          '...')
+                    results = run_steps(steps)
+                    report = steps_report(results)
+                    print('\n' + report)
+                    if any(result.status != 'ok' for result in results):
+                        with open('scaffold_error.log', 'w') as fd:
+                            fd.write(report + '\n')
+                        print('\nSome steps did not succeed, '
+                              'see scaffold_error.log')
+                        sys.exit(2)
 
                 print('\nDone. Enjoy it!...\n')
                 break
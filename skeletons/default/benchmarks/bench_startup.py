@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Time the cold start of the app, in a fresh interpreter: importing
+`project`, then each step of `create_app`, as kept in
+`app.extensions['startup']`.
+
+    $ python benchmarks/bench_startup.py [--config ...] [--profile 20]
+                                         [--importtime] [--json]
+
+`--profile N` shows the N functions taking most of the start (cumulative
+time), `--importtime` what `python -X importtime` shows (Python 3.7+).
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in the fresh interpreter, printing the timings as JSON
+startup = """
+import json, time
+start = time.time()
+import project
+imported = time.time() - start
+app = project.create_app({config!r})
+print(json.dumps({{
+    'import': imported,
+    'steps': app.extensions['startup'],
+    'total': time.time() - start,
+    'budget': app.config.get('STARTUP_BUDGET')}}))
+"""
+
+profiled = """
+import cProfile, pstats, sys
+profile = cProfile.Profile()
+profile.enable()
+import project
+project.create_app({config!r})
+profile.disable()
+pstats.Stats(profile, stream=sys.stderr).sort_stats(
+    'cumulative').print_stats({limit})
+"""
+
+
+def get_arguments(argv):
+    """Get arguments from command line."""
+    parser = argparse.ArgumentParser(description='Time the app start.')
+    parser.add_argument('--config', default=os.environ.get(
+        'APP_CONFIG', 'project.config.ProductionConfig'))
+    parser.add_argument('--profile', type=int, default=0, metavar='N',
+                        help='Show the N slowest functions.')
+    parser.add_argument('--importtime', action='store_true',
+                        help='Show the time each module takes to import.')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the timings as JSON.')
+    return parser.parse_args(argv[1:])
+
+
+def python(code, *options):
+    """Run `code` in a fresh interpreter, returning its output and
+    errors."""
+    process = subprocess.Popen(
+        (sys.executable,) + options + ('-c', code), cwd=basedir,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    out, err = process.communicate()
+    if process.returncode:
+        raise SystemExit(err)
+    return out, err
+
+
+def measure(config):
+    """The timings of a cold start, in seconds."""
+    out, err = python(startup.format(config=config))
+    return json.loads(out.splitlines()[-1])
+
+
+def main(args):
+    """Time the start and show where it goes."""
+    timings = measure(args.config)
+    if args.json:
+        print(json.dumps(timings, indent=2))
+        return
+    print('{0:<20} {1:>10.1f} ms'.format('import project',
+                                          timings['import'] * 1000))
+    for name, seconds in timings['steps']:
+        print('{0:<20} {1:>10.1f} ms'.format(name, seconds * 1000))
+    print('{0:<20} {1:>10.1f} ms (budget {2} s)'.format(
+        'total', timings['total'] * 1000, timings['budget']))
+    if args.profile:
+        print(python(profiled.format(config=args.config,
+                                     limit=args.profile))[1])
+    if args.importtime:
+        if sys.version_info < (3, 7):
+            print('-X importtime needs Python 3.7+.')
+        else:
+            print(python('import project', '-X', 'importtime')[1])
+
+
+if __name__ == '__main__':
+    main(get_arguments(sys.argv))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark the user lookups of every request, and of the login, on a
+table of many users (a million by default), in a temporary SQLite
+database:
+ - load_user: the user of the session, by id, as before and after the
+   password column was deferred;
+ - login: the user of an email, as before (case sensitive), with a case
+   insensitive lookup but no normalized email index, and after.
+
+    $ python benchmarks/bench_user_lookup.py [--users 1000000]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+os.environ.setdefault('APP_CONFIG', 'project.config.TestingConfig')
+
+from project import create_app, db  # noqa: E402
+from project.user.generate import generate_users  # noqa: E402
+from project.user.models import User, normalize_email  # noqa: E402
+
+
+def get_arguments(argv):
+    """Get arguments from command line."""
+    parser = argparse.ArgumentParser(description='Benchmark user lookups.')
+    parser.add_argument('--users', type=int, default=1000000,
+                        help='Number of users of the table.')
+    parser.add_argument('--lookups', type=int, default=2000,
+                        help='Lookups timed per query.')
+    return parser.parse_args(argv[1:])
+
+
+def time_lookups(lookup, keys):
+    """Microseconds per lookup, each in a session of its own."""
+    start = time.time()
+    for key in keys:
+        lookup(key)
+        db.session.remove()
+    return (time.time() - start) / len(keys) * 1e6
+
+
+def main(args):
+    """Fill a table of users and time the lookups."""
+    app = create_app()
+    workdir = tempfile.mkdtemp(prefix='bench-users-')
+    try:
+        app.config.update(SQLALCHEMY_ECHO=False, SQLALCHEMY_DATABASE_URI=(
+            'sqlite:///' + os.path.join(workdir, 'users.sqlite')))
+        with app.app_context():
+            db.create_all()
+            start = time.time()
+            for inserted in generate_users(args.users, batch=10000,
+                                           same_password=True, seed=0):
+                pass
+            print('{0} users created in {1:.1f} s'.format(
+                inserted, time.time() - start))
+
+            rng = random.Random(0)
+            ids = [rng.randint(1, args.users) for i in range(args.lookups)]
+            emails = [email for email, in db.session.query(User.email)
+                      .filter(User.id.in_(ids[:500]))]
+            emails = [rng.choice(emails).upper()
+                      for i in range(args.lookups)]
+
+            results = [
+                ('load_user, before', lambda user_id: User.query.options(
+                    db.undefer('password')).filter(
+                        User.id == user_id).first(), ids),
+                ('load_user, after', User.by_id, ids),
+                ('login, before', lambda email: User.query.options(
+                    db.undefer('password')).filter_by(
+                        email=normalize_email(email)).first(), emails),
+                ('login, after', lambda email: User.by_email(
+                    email, with_password=True), emails),
+            ]
+            timings = [(name, time_lookups(lookup, keys))
+                       for name, lookup, keys in results]
+            db.session.execute('DROP INDEX ix_user_email_normalized')
+            timings.insert(3, (
+                'login, case insensitive without index',
+                time_lookups(lambda email: User.by_email(
+                    email, with_password=True), emails[:20])))
+            for name, microseconds in timings:
+                print('{0:<40} {1:>12.1f} us'.format(name, microseconds))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(get_arguments(sys.argv))
@@ -3,21 +3,43 @@
 
 
 import os
+import time
 import unittest
 import coverage
 
-from flask.ext.script import Manager
+from flask import current_app
+from flask.ext.script import Command, Manager
 from flask.ext.migrate import Migrate, MigrateCommand
 
-from project import app, db
+from project import create_app, db
+from project.assets import build as build_assets
+from project.profiler import load_profiles, report as report_queries
+from project.templating import warm_up
 from project.user.models import User
+from project.user.generate import generate_users
+from project.user.hashing import calibrate, hasher
 
 
-migrate = Migrate(app, db)
-manager = Manager(app)
+migrate = Migrate()
+
+
+def make_app():
+    """The app, configured by APP_CONFIG."""
+    app = create_app()
+    migrate.init_app(app, db)
+    return app
+
+manager = Manager(make_app)
+
+assets_manager = Manager(usage='Build the static assets.')
+templates_manager = Manager(usage='Compile the templates.')
+queries_manager = Manager(usage='Report on the queries profiled.')
 
 # migrations added to manager
 manager.add_command('db', MigrateCommand)
+manager.add_command('assets', assets_manager)
+manager.add_command('templates', templates_manager)
+manager.add_command('queries', queries_manager)
 
 
 @manager.command
@@ -73,10 +95,102 @@ def create_admin():
     db.session.commit()
 
 
-@manager.command
-def create_data():
-    """Create sample data. Not yet implemmented."""
-    pass
+@manager.option('-t', '--target', type=float, default=250,
+                help='Most milliseconds a hash may take.')
+@manager.option('-o', '--output', default=None,
+                help='File the rounds are saved to, BCRYPT_CALIBRATION if '
+                'none.')
+@manager.option('--min', dest='min_rounds', type=int, default=4)
+@manager.option('--max', dest='max_rounds', type=int, default=16)
+def calibrate_bcrypt(target, output, min_rounds, max_rounds):
+    """Pick the bcrypt rounds hashing in `target` ms on this host."""
+    rounds, timings = calibrate(target / 1000.0, min_rounds, max_rounds)
+    for tried, seconds in timings:
+        print('{0:>3} rounds: {1:8.1f} ms'.format(tried, seconds * 1000))
+    print('BCRYPT_LOG_ROUNDS = {0}'.format(rounds))
+    output = output or current_app.config.get('BCRYPT_CALIBRATION')
+    if output:
+        directory = os.path.dirname(os.path.abspath(output))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(output, 'w') as fd:
+            fd.write('BCRYPT_LOG_ROUNDS = {0}\n'.format(rounds))
+        print('Saved to {0}; passwords are rehashed on login.'.format(
+            output))
+
+
+@manager.option('-u', '--users', type=int, default=1000,
+                help='Number of users to create.')
+@manager.option('-b', '--batch', type=int, default=1000,
+                help='Users inserted per transaction.')
+@manager.option('-w', '--workers', type=int, default=0,
+                help='Processes hashing the passwords, 0 for none.')
+@manager.option('-s', '--same-password', action='store_true',
+                help='Hash one password, "password", for every user.')
+@manager.option('--seed', type=int, default=None)
+def create_data(users, batch, workers, same_password, seed):
+    """Create sample users, in bulk."""
+    start = time.time()
+    inserted = 0
+    for inserted in generate_users(users, batch, workers, hasher.rounds,
+                                   same_password, seed):
+        elapsed = time.time() - start
+        print('{0:>10} users, {1:10.0f} rows/s'.format(
+            inserted, inserted / max(elapsed, 1e-6)))
+    print('Created {0} users in {1:.1f} s.'.format(
+        inserted, time.time() - start))
+
+
+@assets_manager.command
+def build():
+    """Bundle, minify, fingerprint and precompress the CSS and JS."""
+    manifest = build_assets(current_app)
+    for name, path in sorted(manifest['bundles'].items()):
+        print('{0:<20} {1}'.format(name, path))
+    print('{0} files and {1} bundles built, manifest in {2}'.format(
+        len(manifest['files']), len(manifest['bundles']),
+        current_app.config['ASSETS_MANIFEST']))
+
+
+def compile_templates():
+    """Compile the templates into the bytecode cache."""
+    if not current_app.config.get('TEMPLATE_CACHE_DIR'):
+        print('No TEMPLATE_CACHE_DIR configured.')
+        return 1
+    # compiled again, even those this process loaded already
+    current_app.jinja_env.cache.clear()
+    current_app.jinja_env.bytecode_cache.clear()
+    count, seconds = warm_up(current_app)
+    print('{0} templates compiled in {1:.2f} s into {2}'.format(
+        count, seconds, current_app.config['TEMPLATE_CACHE_DIR']))
+
+templates_manager.add_command('compile', Command(compile_templates))
+
+
+@queries_manager.option('-l', '--limit', type=int, default=20,
+                        help='Number of queries shown.')
+@queries_manager.option('-s', '--sort', default='total',
+                        choices=['total', 'count', 'mean', 'p95', 'p99',
+                                 'max', 'n_plus_one'])
+def report(limit, sort):
+    """Summarize the queries profiled, by fingerprint and endpoint."""
+    directory = current_app.config.get('QUERY_PROFILE_DIR')
+    if not directory:
+        print('No QUERY_PROFILE_DIR configured.')
+        return 1
+    queries, endpoints = load_profiles(directory)
+    for line in report_queries(queries, endpoints, limit, sort):
+        print(line)
+
+
+@queries_manager.command
+def reset():
+    """Delete the profiles saved."""
+    directory = current_app.config.get('QUERY_PROFILE_DIR')
+    if directory and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.startswith('queries-'):
+                os.remove(os.path.join(directory, name))
 
 
 if __name__ == '__main__':
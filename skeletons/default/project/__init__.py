@@ -5,72 +5,137 @@
 """Project init."""
 
 import os
+import time
+from contextlib import contextmanager
 
-from flask import Flask, render_template
+from flask import Flask, current_app, render_template
 from flask.ext.login import LoginManager
 from flask.ext.babelex import Babel
 from flask.ext.bcrypt import Bcrypt
 from flask_bootstrap import Bootstrap
-from flask.ext.sqlalchemy import SQLAlchemy
+from werkzeug.contrib.fixers import ProxyFix
 
-app = Flask(__name__)
+from .database import Database
 
-# Config for development
-app.config.from_object(os.environ['APP_CONFIG'])
-app.name = app.config['APP_NAME']  # Define the app name for humans
-
-# Extensions
-babel = Babel(app)
-bcrypt = Bcrypt(app)
-bootstrap = Bootstrap(app)
-db = SQLAlchemy(app)
+# Extensions, bound to the app by create_app
+babel = Babel()
+bcrypt = Bcrypt()
+bootstrap = Bootstrap()
+db = Database()
 login_manager = LoginManager()
-login_manager.init_app(app)
-
-
-from .user.models import User
 
-# Blueprints: import and register
-from .main.views import main_blueprint
-from .user.views import user_blueprint
 
-app.register_blueprint(main_blueprint)
-app.register_blueprint(user_blueprint)
+def create_app(config=None):
+    """Create the app, configured with the `config` object (APP_CONFIG,
+    if none).
+
+    The time each step takes is kept in `app.extensions['startup']`.
+    """
+    app = Flask(__name__)
+    timings = app.extensions['startup'] = []
+
+    @contextmanager
+    def step(name):
+        start = time.time()
+        yield
+        timings.append((name, time.time() - start))
+
+    with step('config'):
+        app.config.from_object(config or os.environ['APP_CONFIG'])
+        if app.config.get('BCRYPT_CALIBRATION'):
+            # BCRYPT_LOG_ROUNDS, as set by `manage.py calibrate_bcrypt`
+            app.config.from_pyfile(app.config['BCRYPT_CALIBRATION'],
+                                   silent=True)
+        app.name = app.config['APP_NAME']  # Define the app name for humans
+        if app.config.get('PROXY_COUNT'):
+            # the client's address, from the X-Forwarded-For of the proxies
+            app.wsgi_app = ProxyFix(app.wsgi_app,
+                                    num_proxies=app.config['PROXY_COUNT'])
+
+    with step('extensions'):
+        babel.init_app(app)
+        bcrypt.init_app(app)
+        bootstrap.init_app(app)
+        db.init_app(app)
+        login_manager.init_app(app)
+        login_manager.login_view = "user.login"
+        login_manager.login_message_category = "danger"
+        login_manager.user_loader(load_user)
+
+    # Extensions kept in app.extensions, each app with its own, so that
+    # another app of the process does not reconfigure this one
+    with step('caches'):
+        from .assets import Assets
+        from .cache import FragmentCache, ResponseCache
+        from .user.cache import UserCache
+        from .user.hashing import PasswordHasher, HasherOverloaded
+
+        Assets(app)
+        FragmentCache(app)
+        ResponseCache(app)
+        UserCache(app)
+        PasswordHasher(app)
+
+    with step('metrics'):
+        from .metrics import Metrics
+        from .profiler import QueryProfiler
+
+        Metrics(app)
+        QueryProfiler(app)
+
+    with step('blueprints'):
+        from .main.views import main_blueprint
+        from .user.views import user_blueprint
+
+        app.register_blueprint(main_blueprint)
+        app.register_blueprint(user_blueprint)
+
+    with step('handlers'):
+        app.register_error_handler(401, forbidden_page)
+        app.register_error_handler(404, page_not_found)
+        app.register_error_handler(500, server_error_page)
+        app.register_error_handler(HasherOverloaded, overloaded_page)
+
+        from . import utils
+        utils.init_app(app)
+
+    # if in development and the toolbar is enabled load it
+    if app.config['DEBUG'] and app.config.get('DEBUG_TB_ENABLED'):
+        with step('debug toolbar'):
+            from flask.ext.debugtoolbar import DebugToolbarExtension
+            DebugToolbarExtension(app)
+
+    # Templates, once every filter and extension is there
+    with step('templates'):
+        from . import templating
+        templating.init_app(app)
+
+    return app
 
 
-# Login manager
-login_manager.login_view = "user.login"
-login_manager.login_message_category = "danger"
-
-
-@login_manager.user_loader
 def load_user(user_id):
-    """Load admin user."""
-    return User.query.filter(User.id == int(user_id)).first()
+    """Load admin user, through the user cache."""
+    from .user.cache import user_cache
+    return user_cache.load(int(user_id))
 
 
 # Error handlers ----------------------------------------------
-@app.errorhandler(401)
 def forbidden_page(error):
     """Error 401 handler."""
     return render_template('errors/401.html'), 403
 
 
-@app.errorhandler(404)
 def page_not_found(error):
     """Error 404 handler."""
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
 def server_error_page(error):
     """Error 500 handler."""
     return render_template('errors/500.html'), 500
 
 
-from . import utils
-
-# if in development and debug is true load debug toolbar
-if app.config['DEBUG']:
-    from flask.ext.debugtoolbar import DebugToolbarExtension
-    toolbar = DebugToolbarExtension(app)
+def overloaded_page(error):
+    """Too many logins and registrations at once."""
+    return render_template('errors/503.html'), 503, {
+        'Retry-After': current_app.config['HASH_RETRY_AFTER']}
@@ -0,0 +1,243 @@
+# project/assets.py
+# -*- coding: utf-8 -*-
+"""Static assets: bundled, minified, fingerprinted and precompressed by
+`manage.py assets build`, then served from the build manifest."""
+
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+import time
+
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.local import LocalProxy
+
+try:
+    import brotli
+except ImportError:  # no .br variants
+    brotli = None
+
+try:
+    from rcssmin import cssmin
+except ImportError:
+    cssmin = None
+
+try:
+    from rjsmin import jsmin
+except ImportError:
+    jsmin = None
+
+# Assets which are bundled, by their extension
+asset_types = ('.css', '.js')
+
+# Seconds built files are cached by clients
+cache_forever = 365 * 24 * 3600
+
+# Precompressed variants, by preference
+encodings = (('br', '.br'), ('gzip', '.gz'))
+
+# What the minified files of a bundle are joined with; a script may not
+# end with a semicolon, nor the next one begin a new statement
+bundle_separators = {'.css': b'\n', '.js': b';\n'}
+
+css_comment = re.compile(r'/\*.*?\*/', re.S)
+css_space = re.compile(r'\s*([{};,>])\s*')
+js_comment_line = re.compile(r'^\s*//.*$', re.M)
+# Template literals and strings continued on the next line
+js_multiline_string = re.compile(r'`|\\$', re.M)
+
+
+def minify_css(text):
+    """Minify a stylesheet, with rcssmin when installed."""
+    if cssmin:
+        return cssmin(text)
+    text = css_comment.sub('', text)
+    text = css_space.sub(r'\1', ' '.join(text.split()))
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    """Minify a script, with rjsmin when installed.
+
+    Without it, only comment lines, indentation and blank lines are
+    removed, and scripts with strings spanning lines are left as they are,
+    as those could be changed.
+    """
+    if jsmin:
+        return jsmin(text)
+    if js_multiline_string.search(text):
+        return text
+    text = js_comment_line.sub('', text)
+    return '\n'.join(line.strip() for line in text.splitlines()
+                     if line.strip())
+
+
+minifiers = {'.css': minify_css, '.js': minify_js}
+
+
+def static_folders(app):
+    """The static endpoints of the app and of its own blueprints, their
+    bundle names and folders."""
+    folders = [('static', 'base', app.static_folder)]
+    for name, blueprint in sorted(app.blueprints.items()):
+        # not those of extensions, such as Flask-Bootstrap
+        if blueprint.has_static_folder and blueprint.static_folder.startswith(
+                app.root_path + os.sep):
+            folders.append(('{0}.static'.format(name), name,
+                            blueprint.static_folder))
+    return folders
+
+
+def asset_sources(folder, build_dir):
+    """The CSS and JS files of a static folder, as their filenames and
+    paths, in the order they are bundled."""
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(name for name in dirs
+                         if os.path.join(root, name) != build_dir)
+        for name in sorted(files):
+            if os.path.splitext(name)[1] in asset_types:
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, folder).replace(os.sep, '/')
+                yield filename, path
+
+
+def fingerprint(path, data):
+    """`styles/base.css` as `styles/base.<content hash>.css`."""
+    root, ext = os.path.splitext(path)
+    return '{0}.{1}{2}'.format(root, hashlib.md5(data).hexdigest()[:12], ext)
+
+
+def write_asset(build_dir, path, data):
+    """Write an asset and its precompressed variants."""
+    target = os.path.join(build_dir, path)
+    if not os.path.isdir(os.path.dirname(target)):
+        os.makedirs(os.path.dirname(target))
+    with open(target, 'wb') as fd:
+        fd.write(data)
+    buf = io.BytesIO()
+    # no name nor mtime, so builds are reproducible
+    with gzip.GzipFile('', 'wb', 9, buf, mtime=0) as fd:
+        fd.write(data)
+    with open(target + '.gz', 'wb') as fd:
+        fd.write(buf.getvalue())
+    if brotli:
+        with open(target + '.br', 'wb') as fd:
+            fd.write(brotli.compress(data))
+
+
+def build(app):
+    """Build the assets of every static folder into ASSETS_BUILD_DIR.
+
+    Each CSS and JS file is minified and fingerprinted, and those of each
+    static folder are bundled as `<blueprint>.css` and `<blueprint>.js`
+    (`base.*` for the app's own). Returns the manifest, which maps
+    `endpoint:filename` and bundle names to the built files.
+    """
+    build_dir = app.config['ASSETS_BUILD_DIR']
+    prefix = os.path.relpath(build_dir, app.static_folder)
+    manifest = {'files': {}, 'bundles': {}}
+    for endpoint, bundle, folder in static_folders(app):
+        bundles = dict((ext, []) for ext in asset_types)
+        for filename, source in asset_sources(folder, build_dir):
+            ext = os.path.splitext(filename)[1]
+            with io.open(source, encoding='utf-8') as fd:
+                data = minifiers[ext](fd.read()).encode('utf-8')
+            bundles[ext].append(data)
+            path = fingerprint('/'.join([bundle, filename]), data)
+            write_asset(build_dir, path, data)
+            manifest['files']['{0}:{1}'.format(endpoint, filename)] = \
+                '/'.join([prefix, path])
+        for ext, parts in sorted(bundles.items()):
+            if parts:
+                data = bundle_separators[ext].join(parts)
+                path = fingerprint(bundle + ext, data)
+                write_asset(build_dir, path, data)
+                manifest['bundles'][bundle + ext] = '/'.join([prefix, path])
+    with open(app.config['ASSETS_MANIFEST'], 'w') as fd:
+        json.dump(manifest, fd, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets(object):
+    """Serves the built assets, once ASSETS_USE_BUILD is set.
+
+    Templates get two helpers:
+     - `asset_url(endpoint, filename=...)`, a `url_for` returning the
+       built file of a static file when there is one;
+     - `bundle_urls(name)`, the URL of a built bundle, or those of the
+       files it bundles when it was not built.
+
+    Built files are served precompressed when the client accepts it, and
+    are cached forever by clients, as their names change with them.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.manifest = {'files': {}, 'bundles': {}}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.prefix = os.path.relpath(app.config['ASSETS_BUILD_DIR'],
+                                      app.static_folder) + '/'
+        if app.config.get('ASSETS_USE_BUILD') and \
+                os.path.isfile(app.config['ASSETS_MANIFEST']):
+            with open(app.config['ASSETS_MANIFEST']) as fd:
+                self.manifest = json.load(fd)
+        app.add_template_global(self.asset_url)
+        app.add_template_global(self.bundle_urls)
+        app.view_functions['static'] = self.send_static_file
+        app.extensions['assets'] = self
+
+    def asset_url(self, endpoint, **values):
+        """`url_for`, for the built file of a static file if any."""
+        built = self.manifest['files'].get('{0}:{1}'.format(
+            endpoint, values.get('filename')))
+        if built:
+            values['filename'] = built
+            endpoint = 'static'
+        return url_for(endpoint, **values)
+
+    def bundle_urls(self, name):
+        """The URLs of a bundle, built or not."""
+        built = self.manifest['bundles'].get(name)
+        if built:
+            return [url_for('static', filename=built)]
+        bundle, ext = os.path.splitext(name)
+        for endpoint, folder_bundle, folder in static_folders(self.app):
+            if folder_bundle == bundle:
+                return [url_for(endpoint, filename=filename)
+                        for filename, source in asset_sources(
+                            folder, self.app.config['ASSETS_BUILD_DIR'])
+                        if filename.endswith(ext)]
+        return []
+
+    def send_static_file(self, filename):
+        """The app's static view, serving built files precompressed."""
+        if not filename.startswith(self.prefix):
+            return self.app.send_static_file(filename)
+        accepted = request.accept_encodings
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding, suffix in encodings:
+            if accepted[encoding] and os.path.isfile(os.path.join(
+                    self.app.static_folder, filename + suffix)):
+                response = send_from_directory(
+                    self.app.static_folder, filename + suffix,
+                    mimetype=mimetype)
+                response.content_encoding = encoding
+                break
+        else:
+            response = self.app.send_static_file(filename)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = cache_forever
+        response.expires = time.time() + cache_forever
+        return response
+
+
+# The assets of the current app
+assets = LocalProxy(lambda: current_app.extensions['assets'])
@@ -0,0 +1,318 @@
+# project/cache.py
+# -*- coding: utf-8 -*-
+"""Project caches."""
+
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, make_response, request, session
+from flask.ext.babelex import get_locale
+from flask.ext.login import current_user
+from jinja2 import Markup, nodes
+from jinja2.ext import Extension
+from werkzeug.contrib.cache import FileSystemCache
+from werkzeug.http import http_date
+from werkzeug.local import LocalProxy
+
+
+class LRUCache(object):
+    """In-process least recently used cache, whose items expire
+    after `ttl` seconds (never, if 0)."""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, or None."""
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None or (item[1] and item[1] < time.time()):
+                self.misses += 1
+                return None
+            # reinserted as the most recently used
+            self._items[key] = item
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, ttl=None):
+        """Cache a value."""
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (value, time.time() + ttl if ttl else 0)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        """Remove a value from the cache."""
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        """Remove every value from the cache."""
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        """Hit and miss counters."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._items), 'maxsize': self.maxsize}
+
+
+class SharedCache(object):
+    """Cache shared by the processes of a host, kept on the filesystem.
+
+    Values must be picklable. The counters are the process' own.
+    """
+
+    def __init__(self, directory, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = FileSystemCache(directory, threshold=maxsize,
+                                      default_timeout=ttl)
+
+    def get(self, key):
+        """Return the cached value, or None."""
+        value = self._cache.get(str(key))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Cache a value."""
+        self._cache.set(str(key), value, timeout=ttl)
+
+    def delete(self, key):
+        """Remove a value from the cache."""
+        self._cache.delete(str(key))
+
+    def clear(self):
+        """Remove every value from the cache."""
+        self._cache.clear()
+
+    def stats(self):
+        """Hit and miss counters."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'maxsize': self.maxsize}
+
+
+class NullCache(object):
+    """A cache which never caches anything."""
+
+    hits = 0
+
+    def __init__(self):
+        self.misses = 0
+
+    def get(self, key):
+        self.misses += 1
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {'hits': 0, 'misses': self.misses}
+
+
+def make_cache(kind, maxsize=1024, ttl=300, directory=None):
+    """Create a cache: `lru`, `shared` (needs a directory) or `null`."""
+    if kind == 'lru':
+        return LRUCache(maxsize, ttl)
+    if kind == 'shared':
+        return SharedCache(directory, maxsize, ttl)
+    if kind == 'null':
+        return NullCache()
+    raise ValueError('Unknown cache type: {0}'.format(kind))
+
+
+class ResponseCache(object):
+    """Cache of whole responses of views, served with an ETag and a
+    Last-Modified, and as 304 to the clients which have them already.
+
+    Views are cached with the `cached` decorator. Responses vary by path
+    and query string, authentication state (or user, with `per_user`)
+    and locale. Requests with flashed messages to show, and anything but
+    successful GETs, are never cached.
+    """
+
+    def __init__(self, app=None):
+        self.cache = make_cache('null')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache = make_cache(app.config.get('RESPONSE_CACHE_TYPE', 'lru'),
+                                app.config.get('RESPONSE_CACHE_SIZE', 256),
+                                app.config.get('RESPONSE_CACHE_TTL', 60),
+                                app.config.get('RESPONSE_CACHE_DIR'))
+        app.extensions['response_cache'] = self
+
+    def serve(self, view, args, kwargs, ttl=None, per_user=False):
+        """The response of a view, out of the cache when it is there."""
+        if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+            return view(*args, **kwargs)
+        key = self.key(view, per_user)
+        entry = self.cache.get(key)
+        if entry is None:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.direct_passthrough:
+                return response
+            entry = self.entry(response)
+            self.cache.set(key, entry, ttl)
+        return self.response(entry)
+
+    @staticmethod
+    def key(view, per_user):
+        """The cache key of the current request."""
+        if not current_user.is_authenticated:
+            user = 'anonymous'
+        else:
+            user = current_user.get_id() if per_user else 'authenticated'
+        return 'view:{0}.{1}:{2}:{3}:{4}'.format(
+            view.__module__, view.__name__, request.full_path, user,
+            get_locale())
+
+    @staticmethod
+    def entry(response):
+        """What is cached of a response."""
+        body = response.get_data()
+        headers = [(name, value) for name, value in response.headers
+                   if name not in ('Content-Length', 'Set-Cookie')]
+        return body, headers, hashlib.md5(body).hexdigest(), time.time()
+
+    @staticmethod
+    def response(entry):
+        """A response out of the cache, made conditional."""
+        body, headers, etag, modified = entry
+        response = current_app.response_class(body, headers=headers)
+        response.set_etag(etag)
+        response.headers['Last-Modified'] = http_date(modified)
+        response.headers['Vary'] = 'Cookie, Accept-Language'
+        response.cache_control.no_cache = True
+        if current_user.is_authenticated:
+            response.cache_control.private = True
+        return response.make_conditional(request)
+
+    def stats(self):
+        """Hit and miss counters."""
+        return self.cache.stats()
+
+
+# The response cache of the current app
+response_cache = LocalProxy(lambda: current_app.extensions['response_cache'])
+
+
+def cached(ttl=None, per_user=False):
+    """Decorator caching the responses of a view for `ttl` seconds, in
+    the response cache of the app."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            return response_cache.serve(view, args, kwargs, ttl, per_user)
+        return wrapper
+    return decorator
+
+
+class FragmentCache(object):
+    """Cache of template fragments, marked in templates with:
+
+        {% cache "header", current_user.is_authenticated, ttl=300 %}
+          ...
+        {% endcache %}
+
+    The fragment is cached by its name and the values it varies by (a
+    method, like `User.is_authenticated`, is called), for `ttl` seconds
+    or FRAGMENT_CACHE_TTL. The time its rendering took is counted as
+    saved on every hit.
+    """
+
+    def __init__(self, app=None):
+        self.cache = make_cache('null')
+        self.counters = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache = make_cache(app.config.get('FRAGMENT_CACHE_TYPE', 'lru'),
+                                app.config.get('FRAGMENT_CACHE_SIZE', 128),
+                                app.config.get('FRAGMENT_CACHE_TTL', 300),
+                                app.config.get('FRAGMENT_CACHE_DIR'))
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.jinja_env.fragment_cache = self
+        app.extensions['fragment_cache'] = self
+
+    def render(self, name, vary, ttl, caller):
+        """The fragment, out of the cache or rendered by `caller`."""
+        key = 'fragment:{0}:{1}'.format(name, ':'.join(
+            str(value() if callable(value) else value) for value in vary))
+        entry = self.cache.get(key)
+        if entry is None:
+            start = time.time()
+            entry = (caller(), time.time() - start)
+            self.cache.set(key, entry, ttl)
+            self.count(name, 'misses')
+        else:
+            self.count(name, 'hits', entry[1])
+        return Markup(entry[0])
+
+    def count(self, name, counter, saved=0):
+        """Update the counters of a fragment."""
+        with self._lock:
+            counters = self.counters.setdefault(
+                name, {'hits': 0, 'misses': 0, 'saved': 0.0})
+            counters[counter] += 1
+            counters['saved'] += saved
+
+    def stats(self):
+        """Hits, misses and seconds of rendering saved per fragment."""
+        with self._lock:
+            return dict((name, dict(counters))
+                        for name, counters in self.counters.items())
+
+
+class FragmentCacheExtension(Extension):
+    """The `{% cache %}` tag of the fragment cache."""
+
+    tags = set(['cache'])
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        name = parser.parse_expression()
+        vary, ttl = [], nodes.Const(None)
+        while parser.stream.skip_if('comma'):
+            if parser.stream.current.test('name:ttl') and \
+                    parser.stream.look().test('assign'):
+                next(parser.stream)
+                next(parser.stream)
+                ttl = parser.parse_expression()
+            else:
+                vary.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('_render', [name, nodes.List(vary), ttl])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, name, vary, ttl, caller):
+        return self.environment.fragment_cache.render(name, vary, ttl,
+                                                      caller)
+
+
+# The fragment cache of the current app
+fragment_cache = LocalProxy(lambda: current_app.extensions['fragment_cache'])
@@ -0,0 +1,148 @@
+# project/database.py
+# -*- coding: utf-8 -*-
+"""Database engine and connection pool."""
+
+import threading
+import time
+
+from flask import current_app, has_app_context
+from flask.ext.sqlalchemy import SQLAlchemy
+from sqlalchemy import event, exc, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+# DBAPI connect() arguments setting the statement timeout, in ms
+statement_timeouts = {
+    'postgresql': ('options', '-c statement_timeout={0:d}'),
+    'mysql': ('init_command', 'SET SESSION max_execution_time={0:d}'),
+}
+
+
+class TimedQueuePool(QueuePool):
+    """Queue pool timing how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        QueuePool.__init__(self, *args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self._waiting = threading.local()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        # QueuePool._do_get calls itself again when it loses a race
+        if getattr(self._waiting, 'since', None) is not None:
+            return QueuePool._do_get(self)
+        self._waiting.since = start = time.time()
+        try:
+            return QueuePool._do_get(self)
+        except exc.TimeoutError:
+            with self._wait_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            self._waiting.since = None
+            wait = time.time() - start
+            with self._wait_lock:
+                self.checkouts += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+
+
+class Database(SQLAlchemy):
+    """Flask-SQLAlchemy, with the engine profile of the configuration.
+
+    Besides the SQLALCHEMY_POOL_* settings, it applies:
+     - DATABASE_CONNECT_OPTIONS: arguments of the DBAPI `connect()`;
+     - DATABASE_PRE_PING: test connections as they are checked out,
+       replacing those the server dropped;
+     - DATABASE_STATEMENT_TIMEOUT: most milliseconds a statement may
+       run (PostgreSQL and MySQL), 0 for no limit.
+    """
+
+    def apply_driver_hacks(self, app, info, options):
+        SQLAlchemy.apply_driver_hacks(self, app, info, options)
+        connect_args = options.setdefault('connect_args', {})
+        connect_args.update(app.config.get('DATABASE_CONNECT_OPTIONS') or {})
+        timeout = app.config.get('DATABASE_STATEMENT_TIMEOUT')
+        if timeout and info.get_backend_name() in statement_timeouts:
+            name, value = statement_timeouts[info.get_backend_name()]
+            connect_args.setdefault(name, value.format(timeout))
+        if 'poolclass' not in options:
+            options['poolclass'] = TimedQueuePool
+
+    def get_engine(self, app=None, bind=None):
+        engine = SQLAlchemy.get_engine(self, app, bind)
+        if (self.get_app(app).config.get('DATABASE_PRE_PING') and
+                not event.contains(engine, 'engine_connect',
+                                   ping_connection)):
+            event.listen(engine, 'engine_connect', ping_connection)
+        return engine
+
+
+def ping_connection(connection, branch):
+    """Test a connection before it is used, reconnecting if dropped."""
+    if branch:
+        return
+    should_close_with_result = connection.should_close_with_result
+    connection.should_close_with_result = False
+    try:
+        connection.scalar(select([1]))
+    except exc.DBAPIError as error:
+        # the connection was invalidated, and reconnects on its next use
+        if not error.connection_invalidated:
+            raise
+        connection.scalar(select([1]))
+    finally:
+        connection.should_close_with_result = should_close_with_result
+
+
+# Extensions of the app given the time of each SQL query, by their
+# `record_query(statement, seconds)`
+query_recorders = ('metrics', 'profiler')
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    conn.info['query_start'] = time.time()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context,
+                         executemany):
+    start = conn.info.pop('query_start', None)
+    if start is None or not has_app_context():
+        return
+    seconds = time.time() - start
+    for name in query_recorders:
+        extension = current_app.extensions.get(name)
+        if extension is not None:
+            extension.record_query(statement, seconds)
+
+
+def time_queries():
+    """Time the SQL queries of every engine, once for all the extensions
+    in `query_recorders`."""
+    for name, listener in (('before_cursor_execute', before_cursor_execute),
+                           ('after_cursor_execute', after_cursor_execute)):
+        if not event.contains(Engine, name, listener):
+            event.listen(Engine, name, listener)
+
+
+def pool_stats(engine):
+    """Connections checked out, in overflow, and the checkout waits."""
+    pool = engine.pool
+    stats = {'pool': pool.__class__.__name__, 'status': pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update(size=pool.size(), checked_in=pool.checkedin(),
+                     checked_out=pool.checkedout(),
+                     overflow=max(0, pool.overflow()),
+                     max_overflow=pool._max_overflow,
+                     timeout=pool._timeout)
+    if isinstance(pool, TimedQueuePool):
+        with pool._wait_lock:
+            stats.update(checkouts=pool.checkouts, timeouts=pool.timeouts,
+                         wait_max=pool.wait_max,
+                         wait_average=pool.wait_total /
+                         max(1, pool.checkouts))
+    return stats
@@ -1,7 +1,13 @@
 # main/views.py
 """Main views."""
 
-from flask import render_template, Blueprint
+from flask import (render_template, Blueprint, abort, current_app, jsonify,
+                   request)
+
+from .. import db
+from ..cache import cached
+from ..database import pool_stats
+from ..metrics import metrics
 
 # Create blueprint
 main_blueprint = Blueprint('main', __name__,
@@ -13,12 +19,43 @@ main_blueprint = Blueprint('main', __name__,
 
 # main blueprint routes
 @main_blueprint.route('/')
+@cached()
 def home():
     """Home view."""
-    return render_template('home.html')
+    return render_template('main/home.html')
 
 
 @main_blueprint.route('/about')
+@cached()
 def about():
     """About view."""
-    return render_template('about.html')
+    return render_template('main/about.html')
+
+
+def stats_allowed():
+    """Whether the client is one of STATS_ALLOWED_IPS. Requests forwarded
+    by a proxy are refused unless PROXY_COUNT is set, as their address
+    is then the proxy's."""
+    if 'X-Forwarded-For' in request.headers and \
+            not current_app.config.get('PROXY_COUNT'):
+        return False
+    return request.remote_addr in current_app.config['STATS_ALLOWED_IPS']
+
+
+@main_blueprint.route('/_stats/pool')
+def stats_pool():
+    """Connection pool statistics, for the allowed clients."""
+    if not stats_allowed():
+        abort(404)
+    return jsonify(pool_stats(db.engine))
+
+
+@main_blueprint.route('/metrics')
+def metrics_page():
+    """Request metrics, in the Prometheus text format, for the allowed
+    clients."""
+    if not metrics.enabled or not stats_allowed():
+        abort(404)
+    return current_app.response_class(
+        metrics.render(), content_type='text/plain; version=0.0.4; '
+        'charset=utf-8')
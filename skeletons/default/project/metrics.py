@@ -0,0 +1,304 @@
+# project/metrics.py
+# -*- coding: utf-8 -*-
+"""Request metrics, per endpoint, in the Prometheus text format."""
+
+import bisect
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from jinja2 import Template
+from werkzeug.local import LocalProxy
+
+from .database import time_queries
+
+# Upper bounds of the histogram buckets
+second_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                  10.0)
+byte_buckets = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+count_buckets = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram(object):
+    """Observations counted in buckets, by label values.
+
+    Each row holds the count of every bucket (the last one is +Inf), then
+    the sum and the count of the observations.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.rows = {}
+
+    def observe(self, values, value):
+        row = self.rows.get(values)
+        if row is None:
+            row = self.rows[values] = [0] * (len(self.buckets) + 3)
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def samples(self, values, row):
+        """The lines of the text format of a row."""
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), row[:-2]):
+            cumulative += count
+            yield '{0}_bucket{1} {2}'.format(
+                self.name, labels(self.labels + ('le',),
+                                  values + (bound,)), cumulative)
+        yield '{0}_sum{1} {2!r}'.format(self.name,
+                                        labels(self.labels, values),
+                                        float(row[-2]))
+        yield '{0}_count{1} {2}'.format(self.name,
+                                        labels(self.labels, values), row[-1])
+
+
+class Counter(object):
+    """A total, by label values. Rows are one item lists, as those of a
+    histogram are lists."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.rows = {}
+
+    def inc(self, values, value=1):
+        row = self.rows.get(values)
+        if row is None:
+            row = self.rows[values] = [0]
+        row[0] += value
+
+    def samples(self, values, row):
+        yield '{0}{1} {2}'.format(self.name, labels(self.labels, values),
+                                  row[0])
+
+
+def labels(names, values):
+    """`{name="value",...}`, escaped."""
+    if not names:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(name, str(value).replace(
+        '\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in zip(names, values)) + '}'
+
+
+def merge(rows, other):
+    """Add the rows of an other process to `rows`."""
+    for values, row in other.items():
+        mine = rows.setdefault(values, [0] * len(row))
+        for i, value in enumerate(row):
+            mine[i] += value
+
+
+def load_rows(path):
+    """The rows of every metric saved in a file, `{}` if unreadable."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    return dict((name, dict((tuple(values), row) for values, row in rows))
+                for name, rows in data.items())
+
+
+def save_rows(path, snapshot):
+    """Save the rows of every metric in a file, atomically."""
+    data = dict((name, [[list(values), row] for values, row in rows.items()])
+                for name, rows in snapshot.items())
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.rename(temp, path)
+
+
+def clear_directory(directory):
+    """Remove the metrics saved by the processes of a previous server."""
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def retire_process(directory, pid):
+    """Add the metrics of an exited process to those of all the exited
+    ones, so that the totals never go backwards, even when its pid is
+    given to a new process."""
+    path = os.path.join(directory, 'metrics-{0}.json'.format(pid))
+    rows = load_rows(path)
+    if not rows:
+        return
+    exited = os.path.join(directory, 'metrics-exited.json')
+    totals = load_rows(exited)
+    for name, other in rows.items():
+        merge(totals.setdefault(name, {}), other)
+    save_rows(exited, totals)
+    os.remove(path)
+
+
+class TimedTemplate(Template):
+    """Template adding the time it takes to render to the request's."""
+
+    def render(self, *args, **kwargs):
+        start = time.time()
+        try:
+            return Template.render(self, *args, **kwargs)
+        finally:
+            if has_request_context() and g.get('metrics'):
+                g.metrics['template'] += time.time() - start
+
+
+class Metrics(object):
+    """Latency, SQL queries and time, template render time and response
+    size of the requests, per endpoint.
+
+    The metrics are the process' own, unless METRICS_DIR is set: each
+    process then saves its own there every METRICS_FLUSH_INTERVAL seconds,
+    and `render` adds up those of them all, as needed by `run --workers`,
+    whose supervisor adds those of its exited workers up into one file.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.directory = None
+        self.flush_interval = 5
+        self.next_flush = 0
+        self._lock = threading.Lock()
+        self.metrics = [
+            Counter('http_requests_total', 'Requests answered.',
+                    ('endpoint', 'method', 'status')),
+            Histogram('http_request_duration_seconds',
+                      'Time taken to answer requests.', ('endpoint',),
+                      second_buckets),
+            Histogram('http_response_size_bytes', 'Size of the responses.',
+                      ('endpoint',), byte_buckets),
+            Histogram('db_queries_per_request',
+                      'SQL queries run by requests.', ('endpoint',),
+                      count_buckets),
+            Histogram('db_query_duration_seconds',
+                      'Time requests spent in SQL queries.', ('endpoint',),
+                      second_buckets),
+            Histogram('template_render_duration_seconds',
+                      'Time requests spent rendering templates.',
+                      ('endpoint',), second_buckets),
+        ]
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['metrics'] = self
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        if not self.enabled:
+            return
+        self.directory = app.config.get('METRICS_DIR')
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 5)
+        if self.directory and not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        app.jinja_env.template_class = TimedTemplate
+        time_queries()
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+
+    def before_request(self):
+        g.metrics = {'start': time.time(), 'queries': 0, 'sql': 0.0,
+                     'template': 0.0}
+
+    def after_request(self, response):
+        size = response.calculate_content_length()
+        self.record(response.status_code, size or 0)
+        return response
+
+    def teardown_request(self, error):
+        # unhandled errors, whose responses are not seen by after_request
+        if error is not None:
+            self.record(500, 0)
+
+    def record_query(self, statement, seconds):
+        """Count a SQL query of the current request (see
+        `project.database.time_queries`)."""
+        if has_request_context() and g.get('metrics'):
+            g.metrics['queries'] += 1
+            g.metrics['sql'] += seconds
+
+    def record(self, status, size):
+        """Count the current request, once."""
+        metrics = g.get('metrics')
+        if metrics is None:
+            return
+        g.metrics = None
+        endpoint = (request.url_rule.endpoint if request.url_rule
+                    else 'none',)
+        requests, duration, sizes, queries, sql, template = self.metrics
+        with self._lock:
+            requests.inc(endpoint + (request.method, status))
+            duration.observe(endpoint, time.time() - metrics['start'])
+            sizes.observe(endpoint, size)
+            queries.observe(endpoint, metrics['queries'])
+            sql.observe(endpoint, metrics['sql'])
+            template.observe(endpoint, metrics['template'])
+        if self.directory and time.time() >= self.next_flush:
+            self.flush()
+
+    def snapshot(self):
+        """The rows of every metric."""
+        with self._lock:
+            return dict((metric.name, dict(
+                (values, list(row)) for values, row in metric.rows.items()))
+                for metric in self.metrics)
+
+    def filename(self):
+        return os.path.join(self.directory, 'metrics-{0}.json'.format(
+            os.getpid()))
+
+    def flush(self):
+        """Save the metrics of the process in METRICS_DIR."""
+        self.next_flush = time.time() + self.flush_interval
+        save_rows(self.filename(), self.snapshot())
+
+    def collect(self):
+        """The rows of every metric, of all the processes, the exited
+        ones included (see `retire_process`)."""
+        snapshot = self.snapshot()
+        if not self.directory:
+            return snapshot
+        mine = self.filename()
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            if path == mine:
+                continue
+            for name, rows in load_rows(path).items():
+                if name in snapshot:
+                    merge(snapshot[name], rows)
+        return snapshot
+
+    def render(self):
+        """The metrics, in the Prometheus text format."""
+        snapshot = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append('# HELP {0} {1}'.format(metric.name, metric.help))
+            lines.append('# TYPE {0} {1}'.format(metric.name, metric.kind))
+            for values, row in sorted(snapshot[metric.name].items()):
+                lines.extend(metric.samples(values, row))
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            for metric in self.metrics:
+                metric.rows.clear()
+
+
+# The metrics of the current app
+metrics = LocalProxy(lambda: current_app.extensions['metrics'])
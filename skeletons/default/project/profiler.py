@@ -0,0 +1,290 @@
+# project/profiler.py
+# -*- coding: utf-8 -*-
+"""Query profiler: statements grouped by fingerprint, per request, with
+the slow ones logged and the ones repeated in a request flagged as N+1."""
+
+import glob
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from werkzeug.local import LocalProxy
+
+from .database import time_queries
+
+comments = re.compile(r'/\*.*?\*/|--[^\n]*', re.S)
+strings = re.compile(r"'(?:[^']|'')*'")
+parameters = re.compile(r'%\(\w+\)s|%s|(?<!:):\w+|\?')
+numbers = re.compile(r'\b\d+(?:\.\d+)?\b')
+spaces = re.compile(r'\s+')
+in_lists = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+repeated_rows = re.compile(r'(\([?, ]+\))(?:\s*,\s*\1)+')
+
+
+def fingerprint(statement):
+    """The statement, with its values and parameters as `?`, so that the
+    same query with other values has the same fingerprint."""
+    statement = comments.sub(' ', statement)
+    statement = strings.sub('?', statement)
+    statement = parameters.sub('?', statement)
+    statement = numbers.sub('?', statement)
+    statement = spaces.sub(' ', statement).strip()
+    statement = in_lists.sub('(?)', statement)
+    return repeated_rows.sub(r'\1', statement)
+
+
+def percentile(samples, percent):
+    """Nearest-rank percentile of sorted samples."""
+    if not samples:
+        return 0.0
+    index = max(0, int(round(percent / 100.0 * len(samples))) - 1)
+    return samples[min(index, len(samples) - 1)]
+
+
+class Stats(object):
+    """Count, total, max and a reservoir of at most `size` samples of a
+    series of values."""
+
+    def __init__(self, size):
+        self.size = size
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+        else:
+            index = random.randrange(self.count)
+            if index < self.size:
+                self.samples[index] = value
+
+    def merge(self, other):
+        self.count += other['count']
+        self.total += other['total']
+        self.max = max(self.max, other['max'])
+        self.samples.extend(other['samples'])
+
+    def summary(self):
+        samples = sorted(self.samples)
+        return {'count': self.count, 'total': self.total, 'max': self.max,
+                'mean': self.total / self.count if self.count else 0.0,
+                'p50': percentile(samples, 50), 'p95': percentile(samples, 95),
+                'p99': percentile(samples, 99)}
+
+    def to_dict(self):
+        return {'count': self.count, 'total': self.total, 'max': self.max,
+                'samples': list(self.samples)}
+
+
+class QueryProfiler(object):
+    """Profile of the SQL statements run, by fingerprint, and of the
+    queries of the requests, by endpoint.
+
+    Statements over QUERY_SLOW_THRESHOLD seconds are logged, as are the
+    fingerprints run QUERY_N_PLUS_ONE_THRESHOLD times or more by one
+    request, likely a relationship loaded once per row (N+1). Each process
+    saves its profile in QUERY_PROFILE_DIR every
+    QUERY_PROFILE_FLUSH_INTERVAL seconds, for `manage.py queries report`.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.logger = None
+        self.slow_threshold = 0.5
+        self.n_plus_one_threshold = 5
+        self.samples = 1000
+        self.directory = None
+        self.flush_interval = 10
+        self.next_flush = 0
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+        self.queries = {}  # fingerprint: Stats, N+1 and example
+        self.endpoints = {}  # endpoint: Stats of queries and of time
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['profiler'] = self
+        self.enabled = app.config.get('QUERY_PROFILER_ENABLED', True)
+        if not self.enabled:
+            return
+        self.logger = app.logger
+        self.slow_threshold = app.config.get('QUERY_SLOW_THRESHOLD', 0.5)
+        self.n_plus_one_threshold = app.config.get(
+            'QUERY_N_PLUS_ONE_THRESHOLD', 5)
+        self.samples = app.config.get('QUERY_PROFILE_SAMPLES', 1000)
+        self.directory = app.config.get('QUERY_PROFILE_DIR')
+        self.flush_interval = app.config.get('QUERY_PROFILE_FLUSH_INTERVAL',
+                                             10)
+        if self.directory and not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        time_queries()
+        app.before_request(self.before_request)
+        app.teardown_request(self.teardown_request)
+
+    def fingerprint(self, statement):
+        """The fingerprint of a statement, cached: SQLAlchemy runs the
+        same few statements over and over."""
+        result = self._fingerprints.get(statement)
+        if result is None:
+            if len(self._fingerprints) > 4096:
+                self._fingerprints.clear()
+            result = self._fingerprints[statement] = fingerprint(statement)
+        return result
+
+    def record_query(self, statement, seconds):
+        """Count a statement, in its request's profile too (see
+        `project.database.time_queries`)."""
+        if not self.enabled:
+            return
+        key = self.fingerprint(statement)
+        with self._lock:
+            query = self.queries.get(key)
+            if query is None:
+                query = self.queries[key] = {
+                    'stats': Stats(self.samples), 'n_plus_one': 0,
+                    'example': statement}
+            query['stats'].add(seconds)
+        if has_request_context() and g.get('queries') is not None:
+            g.queries.append((key, seconds))
+        if seconds >= self.slow_threshold:
+            self.logger.warning('Slow query, %.3f s%s: %s', seconds,
+                                ' on ' + request.path
+                                if has_request_context() else '',
+                                statement)
+
+    def before_request(self):
+        g.queries = []
+
+    def teardown_request(self, error):
+        queries = g.get('queries')
+        if queries is None:
+            return
+        g.queries = None
+        endpoint = (request.url_rule.endpoint if request.url_rule
+                    else 'none')
+        repeated = {}
+        for key, seconds in queries:
+            repeated[key] = repeated.get(key, 0) + 1
+        repeated = dict((key, count) for key, count in repeated.items()
+                        if count >= self.n_plus_one_threshold)
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = {
+                    'queries': Stats(self.samples),
+                    'seconds': Stats(self.samples)}
+            stats['queries'].add(len(queries))
+            stats['seconds'].add(sum(seconds for key, seconds in queries))
+            for key in repeated:
+                self.queries[key]['n_plus_one'] += 1
+        for key, count in repeated.items():
+            self.logger.warning('Likely N+1, %d times on %s: %s', count,
+                                request.path, key)
+        if self.directory and time.time() >= self.next_flush:
+            self.flush()
+
+    def to_dict(self):
+        """The profile of the process."""
+        with self._lock:
+            return {
+                'queries': dict(
+                    (key, {'stats': query['stats'].to_dict(),
+                           'n_plus_one': query['n_plus_one'],
+                           'example': query['example']})
+                    for key, query in self.queries.items()),
+                'endpoints': dict(
+                    (endpoint, dict((name, value.to_dict())
+                                    for name, value in stats.items()))
+                    for endpoint, stats in self.endpoints.items())}
+
+    def filename(self):
+        return os.path.join(self.directory, 'queries-{0}.json'.format(
+            os.getpid()))
+
+    def flush(self):
+        """Save the profile of the process in QUERY_PROFILE_DIR."""
+        self.next_flush = time.time() + self.flush_interval
+        fd, path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.rename(path, self.filename())
+
+    def reset(self):
+        with self._lock:
+            self.queries.clear()
+            self.endpoints.clear()
+
+
+# The query profiler of the current app
+profiler = LocalProxy(lambda: current_app.extensions['profiler'])
+
+
+def load_profiles(directory, samples=1000):
+    """The profiles saved in `directory`, added up, as `(queries,
+    endpoints)`: the summary of each fingerprint and of each endpoint."""
+    queries, endpoints = {}, {}
+    for path in glob.glob(os.path.join(directory, 'queries-*.json')):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            continue
+        for key, query in data['queries'].items():
+            mine = queries.setdefault(key, {
+                'stats': Stats(samples), 'n_plus_one': 0,
+                'example': query['example']})
+            mine['stats'].merge(query['stats'])
+            mine['n_plus_one'] += query['n_plus_one']
+        for endpoint, stats in data['endpoints'].items():
+            mine = endpoints.setdefault(endpoint, {
+                'queries': Stats(samples), 'seconds': Stats(samples)})
+            for name, value in stats.items():
+                mine[name].merge(value)
+    return (dict((key, dict(query['stats'].summary(),
+                            n_plus_one=query['n_plus_one'],
+                            example=query['example']))
+                 for key, query in queries.items()),
+            dict((endpoint, dict((name, value.summary())
+                                 for name, value in stats.items()))
+                 for endpoint, stats in endpoints.items()))
+
+
+def report(queries, endpoints, limit=20, sort='total'):
+    """The lines of a report of the profiles."""
+    lines = ['{0:>8} {1:>10} {2:>9} {3:>9} {4:>9} {5:>9} {6:>5}  {7}'.format(
+        'count', 'total ms', 'mean ms', 'p95 ms', 'p99 ms', 'max ms', 'N+1',
+        'query')]
+    for key, query in sorted(queries.items(), key=lambda item: -item[1][
+            sort])[:limit]:
+        lines.append(
+            '{0[count]:>8} {1:>10.1f} {2:>9.2f} {3:>9.2f} {4:>9.2f} '
+            '{5:>9.2f} {0[n_plus_one]:>5}  {6}'.format(
+                query, query['total'] * 1000, query['mean'] * 1000,
+                query['p95'] * 1000, query['p99'] * 1000,
+                query['max'] * 1000, key))
+    lines.append('')
+    lines.append('{0:<30} {1:>8} {2:>9} {3:>9} {4:>9} {5:>9}'.format(
+        'endpoint', 'requests', 'queries', 'p95', 'max', 'p95 ms'))
+    lines.append('{0:<30} {1:>8} {2:>9} {2:>9} {2:>9} {3:>9}'.format(
+        '', '', 'per req.', 'in SQL'))
+    for endpoint, stats in sorted(endpoints.items(),
+                                  key=lambda item: -item[1]['seconds'][
+                                      'total']):
+        lines.append('{0:<30} {1:>8} {2:>9.1f} {3:>9.0f} {4:>9.0f} '
+                     '{5:>9.2f}'.format(
+                         endpoint, stats['queries']['count'],
+                         stats['queries']['mean'], stats['queries']['p95'],
+                         stats['queries']['max'],
+                         stats['seconds']['p95'] * 1000))
+    return lines
@@ -0,0 +1,183 @@
+# project/reloader.py
+# -*- coding: utf-8 -*-
+"""Reloader for `run -rt inotify`, watching the project with Linux's
+inotify rather than polling every module imported."""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+
+from werkzeug import _reloader
+
+from .templating import reload_templates
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+watch_mask = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE)
+event_header = struct.Struct('iIII')
+
+# Directories of the package which are not watched
+ignored_dirs = ('__pycache__', 'static')
+
+# Files reloaded in place, without a restart
+template_extensions = ('.html', '.jinja', '.j2', '.xml', '.txt')
+
+# Apps whose templates are reloaded in place
+apps = []
+
+
+def load_libc():
+    """libc, if it has inotify."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class InotifyReloaderLoop(_reloader.ReloaderLoop):
+    """Restarts the process once a module of the project, or one of
+    `extra_files`, changes, and reloads the templates in place when only
+    they do.
+
+    Changes are gathered until none happened for `debounce` seconds, so a
+    save touching several files reloads once.
+    """
+
+    name = 'inotify'
+    debounce = 0.1
+
+    def __init__(self, extra_files=None, interval=1):
+        _reloader.ReloaderLoop.__init__(self, extra_files, interval)
+        self.root = os.path.dirname(os.path.abspath(__file__))
+        self.libc = None
+        self.fd = None
+        self.watches = {}  # watch descriptor: directory
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(
+            self.fd, path.encode(sys.getfilesystemencoding()), watch_mask)
+        if wd >= 0:
+            self.watches[wd] = path
+
+    def watch_tree(self, root):
+        """Watch a directory and those below it."""
+        for dirpath, dirs, files in os.walk(root):
+            dirs[:] = [name for name in dirs if name not in ignored_dirs]
+            self.add_watch(dirpath)
+
+    def read_events(self, timeout):
+        """The paths changed within `timeout` seconds (forever if None),
+        or None if some changes were lost."""
+        try:
+            ready = select.select([self.fd], [], [], timeout)[0]
+        except (OSError, select.error) as error:
+            # Python 2 does not retry a select a signal stopped
+            if error.args[0] != errno.EINTR:
+                raise
+            return set()
+        if not ready:
+            return set()
+        data = os.read(self.fd, 65536)
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = event_header.unpack_from(data, offset)
+            offset += event_header.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            if wd not in self.watches:
+                continue
+            path = os.path.join(self.watches[wd],
+                                name.decode(sys.getfilesystemencoding()))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and \
+                        os.path.basename(path) not in ignored_dirs:
+                    self.watch_tree(path)
+                continue
+            paths.add(path)
+        return paths
+
+    def wait(self):
+        """The paths changed, once a burst of changes is over."""
+        changed = self.read_events(None)
+        while changed:
+            more = self.read_events(self.debounce)
+            if more is None:
+                return None
+            if not more:
+                break
+            changed |= more
+        return changed
+
+    def start(self):
+        """Watch the project and `extra_files`, False without inotify."""
+        self.libc = load_libc()
+        if self.libc is None:
+            return False
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        self.watch_tree(self.root)
+        for directory in set(os.path.dirname(filename)
+                             for filename in self.extra_files):
+            if not directory.startswith(self.root + os.sep):
+                self.add_watch(directory)
+        return True
+
+    def handle(self, changed):
+        """Restart for a change of code, reload changed templates."""
+        if changed is None:
+            self.trigger_reload(self.root)
+        project = [path for path in changed
+                   if path.startswith(self.root + os.sep)]
+        restart = sorted(path for path in project if path.endswith('.py'))
+        restart += sorted(changed & self.extra_files)
+        if restart:
+            self.trigger_reload(restart[0])
+        templates = sorted(path for path in project
+                           if path.endswith(template_extensions))
+        if templates:
+            _reloader._log('info', ' * Detected change in %r, reloading'
+                           ' the templates' % templates[0])
+            for app in apps:
+                reload_templates(app)
+
+    def run(self):
+        if not self.start():
+            _reloader._log('info', ' * No inotify, polling with stat')
+            return _reloader.StatReloaderLoop(self.extra_files,
+                                              self.interval).run()
+        while True:
+            self.handle(self.wait())
+
+
+def init_app(app):
+    """Reload the templates of `app` when they change, rather than check
+    them on every render."""
+    app.jinja_env.auto_reload = False
+    apps.append(app)
+
+
+_reloader.reloader_loops['inotify'] = InotifyReloaderLoop
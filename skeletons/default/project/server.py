@@ -0,0 +1,323 @@
+# project/server.py
+# -*- coding: utf-8 -*-
+"""Prefork server: a supervisor forking workers which share its socket,
+each serving requests from a bounded pool of threads."""
+
+import errno
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import BaseWSGIServer
+
+from .metrics import clear_directory, retire_process
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+
+def log(message, *args):
+    """Log to stderr, as the werkzeug server does."""
+    sys.stderr.write(' * [{0}] {1}\n'.format(os.getpid(),
+                                               message.format(*args)))
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server handing the requests to `threads` threads.
+
+    Once they are all busy and as many requests wait for them, no more
+    connections are accepted, which leaves them to the other workers.
+    """
+
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, host, port, app, threads, fd=None):
+        BaseWSGIServer.__init__(self, host, port, app, fd=fd)
+        self.requests = queue.Queue(threads)
+        self.threads = []
+        for i in range(threads):
+            thread = threading.Thread(target=self.process_requests)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def process_request(self, request, client_address):
+        self.requests.put((request, client_address))
+
+    def process_requests(self):
+        """Handle the requests of the queue, until a None."""
+        while True:
+            item = self.requests.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def stop(self, timeout):
+        """Let the threads finish the requests they were given."""
+        for thread in self.threads:
+            self.requests.put(None)
+        deadline = time.time() + timeout
+        for thread in self.threads:
+            thread.join(max(0, deadline - time.time()))
+
+
+class Supervisor(object):
+    """Forks `workers` processes serving the app on one socket, and keeps
+    them running.
+
+    The app is made by `factory` in the supervisor, once, before the
+    workers are forked. `threads` and `graceful_timeout` default to its
+    THREADS_PER_PAGE and SERVER_GRACEFUL_TIMEOUT. Signals:
+     - HUP: the app is made again, new workers are started and the old
+       ones stopped gracefully. The modules the supervisor has imported,
+       config.py included, are not reloaded: a change to them needs a
+       restart;
+     - TERM, INT: the workers are stopped gracefully, then the
+       supervisor exits;
+     - TTIN, TTOU: one more, one less worker.
+
+    A worker which dies is replaced, after a pause growing with the
+    number of workers dying in a row, up to `max_backoff` seconds. The
+    metrics the workers save in METRICS_DIR are cleared on start, and
+    those of the workers which exited added up (see `retire_process`).
+    """
+
+    def __init__(self, factory, host, port, workers, threads=None,
+                 graceful_timeout=None, max_backoff=30):
+        self.factory = factory
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.options = (threads, graceful_timeout)
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout
+        self.max_backoff = max_backoff
+        self.app = None
+        self.socket = None
+        self.children = {}  # pid: (generation, started)
+        self.generation = 0
+        self.signals = []
+        self.crashes = 0
+        self.restart_at = 0
+
+    def listen(self):
+        """The listening socket the workers share."""
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(1024)
+        # the workers all wait on it, one of them gets each connection
+        sock.setblocking(False)
+        return sock
+
+    def load(self):
+        """Make the app, in the supervisor, to be shared by the workers."""
+        self.app = self.factory()
+        self.generation += 1
+        self.threads = self.options[0] or self.app.config.get(
+            'THREADS_PER_PAGE', 8)
+        self.graceful_timeout = self.options[1] or self.app.config.get(
+            'SERVER_GRACEFUL_TIMEOUT', 30)
+
+    @property
+    def metrics_dir(self):
+        """Where the workers save their metrics, if they do."""
+        if self.app is None or not self.app.config.get('METRICS_ENABLED',
+                                                        True):
+            return None
+        return self.app.config.get('METRICS_DIR')
+
+    def run(self):
+        """Serve until TERM or INT."""
+        if not hasattr(os, 'fork'):
+            raise RuntimeError('The prefork server needs os.fork.')
+        self.socket = self.listen()
+        self.load()
+        if self.metrics_dir:
+            # those of a previous server's workers, whose pids are reused
+            clear_directory(self.metrics_dir)
+        for name in ('SIGHUP', 'SIGTERM', 'SIGINT', 'SIGTTIN', 'SIGTTOU'):
+            signal.signal(getattr(signal, name), self.on_signal)
+        log('Serving on http://{0}:{1}/ with {2} workers of {3} threads',
+            self.host, self.port, self.workers, self.threads)
+        try:
+            while True:
+                self.reap()
+                if not self.handle_signals():
+                    break
+                self.spawn_missing()
+                time.sleep(0.5)
+        finally:
+            self.stop(list(self.children))
+            self.socket.close()
+        log('Stopped')
+
+    def on_signal(self, signum, frame):
+        self.signals.append(signum)
+
+    def handle_signals(self):
+        """Act on the signals received, False once asked to stop."""
+        while self.signals:
+            signum = self.signals.pop(0)
+            if signum in (signal.SIGTERM, signal.SIGINT):
+                return False
+            elif signum == signal.SIGHUP:
+                self.reload()
+            elif signum == signal.SIGTTIN:
+                self.workers += 1
+            elif signum == signal.SIGTTOU and self.workers > 1:
+                self.workers -= 1
+                self.stop(sorted(self.children)[:1])
+        return True
+
+    def reload(self):
+        """New workers with a new app, then the old ones stopped. The
+        code is the one already imported (see the class)."""
+        log('Reloading')
+        old = list(self.children)
+        try:
+            self.load()
+        except Exception as error:
+            # keep the workers serving the app which loaded
+            log('Reload failed, keeping the workers: {0!r}', error)
+            return
+        for i in range(self.workers):
+            self.spawn()
+        self.stop(old)
+
+    def reap(self, stopping=False):
+        """Forget the workers which exited, counting the crashes but
+        while `stopping` them."""
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as error:
+                if error.errno == errno.ECHILD:
+                    break
+                raise
+            if not pid:
+                break
+            child = self.children.pop(pid, None)
+            if child is not None:
+                log('Worker {0} exited with status {1}', pid, status)
+                if self.metrics_dir:
+                    retire_process(self.metrics_dir, pid)
+                if status and not stopping:
+                    generation, started = child
+                    # a worker which had been serving a while starts over
+                    if time.time() - started > self.max_backoff:
+                        self.crashes = 0
+                    self.crashes += 1
+                    self.restart_at = time.time() + min(
+                        self.max_backoff, 2 ** (self.crashes - 1) - 1)
+
+    def spawn_missing(self):
+        """Replace the workers which exited, after the backoff."""
+        current = [pid for pid, (generation, started)
+                   in self.children.items()
+                   if generation == self.generation]
+        if len(current) < self.workers and time.time() >= self.restart_at:
+            for i in range(self.workers - len(current)):
+                self.spawn()
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = (self.generation, time.time())
+            return pid
+        # the worker
+        status = 1
+        try:
+            Worker(self.app, self.socket, self.host, self.threads,
+                   self.graceful_timeout).run()
+            status = 0
+        except Exception:
+            sys.excepthook(*sys.exc_info())
+        finally:
+            os._exit(status)
+
+    def stop(self, pids):
+        """Stop the workers gracefully, killing those which take longer
+        than `graceful_timeout`."""
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        deadline = time.time() + self.graceful_timeout
+        while any(pid in self.children for pid in pids):
+            if time.time() >= deadline:
+                for pid in pids:
+                    if pid in self.children:
+                        try:
+                            os.kill(pid, signal.SIGKILL)
+                        except OSError:
+                            pass
+                deadline = float('inf')
+            self.reap(stopping=True)
+            time.sleep(0.1)
+
+
+class Worker(object):
+    """A forked process serving the app until TERM, or its supervisor
+    dies."""
+
+    def __init__(self, app, sock, host, threads, graceful_timeout):
+        self.app = app
+        self.socket = sock
+        self.host = host
+        self.options = (threads, graceful_timeout)
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout
+        self.alive = True
+
+    def on_signal(self, signum, frame):
+        self.alive = False
+
+    def post_fork(self):
+        """Nothing the supervisor opened is used by two processes."""
+        for name in ('SIGHUP', 'SIGTTIN', 'SIGTTOU'):
+            signal.signal(getattr(signal, name), signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, self.on_signal)
+        signal.signal(signal.SIGINT, self.on_signal)
+        db = self.app.extensions.get('sqlalchemy')
+        if db is not None:
+            with self.app.app_context():
+                db.db.get_engine(self.app).dispose()
+
+    def run(self):
+        self.post_fork()
+        parent = os.getppid()
+        server = PooledWSGIServer(self.host, 0, self.app, self.threads,
+                                  fd=self.socket.fileno())
+        server.timeout = 0.5
+        log('Worker started')
+        try:
+            while self.alive and os.getppid() == parent:
+                try:
+                    server.handle_request()
+                except (OSError, select.error) as error:
+                    # Python 2 does not retry a select a signal stopped
+                    if error.args[0] != errno.EINTR:
+                        raise
+        finally:
+            server.stop(self.graceful_timeout)
+            server.server_close()
+            metrics = self.app.extensions.get('metrics')
+            if metrics and metrics.enabled and metrics.directory:
+                # the last requests', for the supervisor to add up
+                metrics.flush()
@@ -0,0 +1,66 @@
+# project/templating.py
+# -*- coding: utf-8 -*-
+"""Templates: bytecode cache and warm-up."""
+
+import os
+import tempfile
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+
+class BytecodeCache(FileSystemBytecodeCache):
+    """Filesystem bytecode cache, whose files are replaced atomically,
+    as every process of the app writes them."""
+
+    def dump_bytecode(self, bucket):
+        fd, path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            bucket.write_bytecode(f)
+        os.rename(path, self._get_cache_filename(bucket))
+
+
+def template_names(app):
+    """The templates of the app and of its own blueprints."""
+    names = set(app.jinja_loader.list_templates()
+                if app.jinja_loader else [])
+    for blueprint in app.blueprints.values():
+        # not those of extensions, such as Flask-Bootstrap
+        if blueprint.jinja_loader and blueprint.root_path.startswith(
+                app.root_path + os.sep):
+            names.update(blueprint.jinja_loader.list_templates())
+    return sorted(names)
+
+
+def warm_up(app):
+    """Load every template, from the bytecode cache or compiling it (and
+    caching its bytecode). Returns the number of templates and the
+    seconds it took."""
+    start = time.time()
+    names = template_names(app)
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names), time.time() - start
+
+
+def reload_templates(app):
+    """Forget the templates loaded, and the pages and fragments rendered
+    with them, so edited templates are used at once."""
+    if app.jinja_env.cache is not None:
+        app.jinja_env.cache.clear()
+    for name in ('fragment_cache', 'response_cache'):
+        if name in app.extensions:
+            app.extensions[name].cache.clear()
+
+
+def init_app(app):
+    """Cache the bytecode of the templates in TEMPLATE_CACHE_DIR, and
+    load them all at once with TEMPLATE_WARMUP, rather than on their
+    first request in each process."""
+    cache_dir = app.config.get('TEMPLATE_CACHE_DIR')
+    if cache_dir:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        app.jinja_env.bytecode_cache = BytecodeCache(cache_dir)
+    if app.config.get('TEMPLATE_WARMUP'):
+        warm_up(app)
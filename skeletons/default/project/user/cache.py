@@ -0,0 +1,104 @@
+# user/cache.py
+"""User identity cache."""
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.session import make_transient_to_detached
+from werkzeug.local import LocalProxy
+
+from .. import db
+from ..cache import make_cache
+from .models import User
+
+
+class UserCache(object):
+    """Cache of the users the login manager loads on every request.
+
+    Users are cached as a snapshot of their columns (but the password)
+    and attached back to the session without querying the database.
+    They are invalidated whenever a user is updated or deleted, and again
+    once that is committed, as a request may have cached the old row in
+    between. Only the "shared" cache is invalidated in every process.
+    """
+
+    def __init__(self, app=None):
+        self.cache = make_cache('null')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache = make_cache(app.config.get('USER_CACHE_TYPE', 'lru'),
+                                app.config.get('USER_CACHE_SIZE', 1024),
+                                app.config.get('USER_CACHE_TTL', 300),
+                                app.config.get('USER_CACHE_DIR'))
+        for name in ('after_update', 'after_delete'):
+            if not event.contains(User, name, invalidate):
+                event.listen(User, name, invalidate)
+        for name, listener in (('after_commit', invalidate_committed),
+                               ('after_rollback', forget_invalidated)):
+            if not event.contains(Session, name, listener):
+                event.listen(Session, name, listener)
+        app.extensions['user_cache'] = self
+
+    def load(self, user_id):
+        """Return the user, from the cache when it is there."""
+        snapshot = self.cache.get(user_id)
+        if snapshot is not None:
+            return self.restore(snapshot)
+        user = User.by_id(user_id)
+        if user is not None:
+            self.cache.set(user_id, self.snapshot(user))
+        return user
+
+    @staticmethod
+    def snapshot(user):
+        """The loaded column values of a user, but the password."""
+        loaded = db.inspect(user).dict
+        return dict((prop.key, loaded[prop.key])
+                    for prop in User.__mapper__.column_attrs
+                    if prop.key in loaded and prop.key != 'password')
+
+    @staticmethod
+    def restore(snapshot):
+        """Attach a user snapshot to the session, without a query.
+
+        Columns missing from the snapshot are loaded when accessed.
+        """
+        user = User.__mapper__.class_manager.new_instance()
+        for key, value in snapshot.items():
+            set_committed_value(user, key, value)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def stats(self):
+        """Hit and miss counters."""
+        return self.cache.stats()
+
+
+def invalidate(mapper, connection, user):
+    """Drop an updated or deleted user from the cache of the app, and
+    remember to drop it again once committed."""
+    if has_app_context() and 'user_cache' in current_app.extensions:
+        current_app.extensions['user_cache'].cache.delete(user.id)
+        session = object_session(user)
+        if session is not None:
+            session.info.setdefault('invalidated_users', set()).add(user.id)
+
+
+def invalidate_committed(session):
+    """Drop the users of a commit from the cache, once more."""
+    user_ids = session.info.pop('invalidated_users', ())
+    if user_ids and has_app_context() and \
+            'user_cache' in current_app.extensions:
+        for user_id in user_ids:
+            current_app.extensions['user_cache'].cache.delete(user_id)
+
+
+def forget_invalidated(session):
+    session.info.pop('invalidated_users', None)
+
+
+# The user cache of the current app
+user_cache = LocalProxy(lambda: current_app.extensions['user_cache'])
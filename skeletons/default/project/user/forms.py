@@ -3,7 +3,10 @@
 
 from flask_wtf import Form
 from wtforms import TextField, PasswordField
-from wtforms.validators import DataRequired, Email, Length, EqualTo
+from wtforms.validators import (DataRequired, Email, Length, EqualTo,
+                                ValidationError)
+
+from .models import User
 
 
 class LoginForm(Form):
@@ -31,3 +34,8 @@ class RegisterForm(Form):
                             validators=[DataRequired(),
                                         EqualTo('password',
                                         message='Passwords must match.')])
+
+    def validate_email(self, field):
+        # whatever its case: emails are unique on lower(email)
+        if User.by_email(field.data) is not None:
+            raise ValidationError('Email already registered.')
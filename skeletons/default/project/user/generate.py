@@ -0,0 +1,94 @@
+# user/generate.py
+"""Sample users, generated in bulk."""
+
+import datetime
+import functools
+import multiprocessing
+import random
+
+from flask.ext.bcrypt import generate_password_hash
+from flask.ext.sqlalchemy import get_debug_queries
+
+from .. import db
+from .models import User
+
+first_names = ['Ada', 'Alan', 'Barbara', 'Dennis', 'Edsger', 'Frances',
+               'Grace', 'Guido', 'John', 'Ken', 'Linus', 'Margaret',
+               'Niklaus', 'Radia', 'Shafi', 'Tim']
+last_names = ['Allen', 'Dijkstra', 'Goldwasser', 'Hamilton', 'Hopper',
+              'Kernighan', 'Knuth', 'Liskov', 'Lovelace', 'McCarthy',
+              'Perlman', 'Ritchie', 'Thompson', 'Torvalds', 'Turing',
+              'Wirth']
+
+
+def user_batches(count, batch, start, password=None, seed=None):
+    """Yield the users to insert, `batch` at a time, as column dicts
+    whose `password` is still in clear."""
+    rng = random.Random(seed)
+    now = datetime.datetime.now()
+    for offset in range(0, count, batch):
+        rows = []
+        for number in range(start + offset,
+                            start + min(count, offset + batch)):
+            first_name = rng.choice(first_names)
+            last_name = rng.choice(last_names)
+            rows.append({
+                'first_name': first_name,
+                'last_name': last_name,
+                'email': '{0}.{1}{2}@example.com'.format(
+                    first_name, last_name, number).lower(),
+                'password': password or 'password{0}'.format(number),
+                'registered_on': now - datetime.timedelta(
+                    seconds=rng.randint(0, 3 * 365 * 86400)),
+                'admin': False,
+            })
+        yield rows
+
+
+def generate_users(count, batch=1000, workers=0, rounds=4,
+                   same_password=False, seed=None):
+    """Insert `count` sample users, yielding the rows inserted so far
+    after each batch.
+
+    Passwords are hashed by a pool of `workers` processes (in this one,
+    if 0), the next batch while the current one is inserted, or hashed
+    once for all when `same_password`. Each batch is a core INSERT in a
+    transaction of its own, so memory does not grow with `count`.
+    """
+    start = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    password = 'password' if same_password else None
+    batches = user_batches(count, batch, start, password, seed)
+    hash_password = functools.partial(generate_password_hash,
+                                      rounds=rounds)
+    pool = multiprocessing.Pool(workers) if workers and not password \
+        else None
+    shared_hash = hash_password(password) if password else None
+
+    def hashing(rows):
+        if rows is None:
+            return None
+        if shared_hash:
+            return rows, lambda: [shared_hash] * len(rows)
+        passwords = [row['password'] for row in rows]
+        if pool:
+            result = pool.map_async(hash_password, passwords)
+            return rows, result.get
+        return rows, lambda: [hash_password(pwd) for pwd in passwords]
+
+    inserted = 0
+    try:
+        current = hashing(next(batches, None))
+        while current:
+            rows, hashes = current
+            for row, pw_hash in zip(rows, hashes()):
+                row['password'] = pw_hash
+            current = hashing(next(batches, None))
+            db.session.execute(User.__table__.insert(), rows)
+            db.session.commit()
+            # in debug, every query and its parameters would be kept
+            del get_debug_queries()[:]
+            inserted += len(rows)
+            yield inserted
+    finally:
+        if pool:
+            pool.terminate()
@@ -0,0 +1,175 @@
+# user/hashing.py
+"""Password hashing, off the request workers."""
+
+import multiprocessing
+import os
+import threading
+import time
+
+from flask import current_app
+from flask.ext.bcrypt import check_password_hash, generate_password_hash
+from werkzeug.local import LocalProxy
+
+
+class HasherOverloaded(Exception):
+    """Too many passwords are waiting to be hashed."""
+
+
+def call(function, args):
+    """Run `function` in a pool process, returning `(failed, result)`,
+    the exception it raised being the result of a failure: python 2 has
+    no error callback for the pool to release the slot of a failed hash.
+    """
+    try:
+        return False, function(*args)
+    except Exception as error:
+        return True, error
+
+
+class PasswordHasher(object):
+    """Bcrypt, run in a bounded pool of processes.
+
+    At most `HASH_QUEUE_SIZE` hashes are pending at any time, any other
+    one is refused at once with `HasherOverloaded`, so a burst of logins
+    can not tie up every request worker. With `HASH_WORKERS = 0` passwords
+    are hashed in the request worker itself.
+    """
+
+    def __init__(self, app=None):
+        self.workers = 0
+        self.queue_size = 0
+        self.timeout = None
+        self.rounds = 12
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = None
+        self.counters = dict(submitted=0, completed=0, rejected=0,
+                             failed=0, pending=0, max_pending=0,
+                             seconds=0.0)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.workers = app.config.get('HASH_WORKERS',
+                                      multiprocessing.cpu_count())
+        self.queue_size = app.config.get('HASH_QUEUE_SIZE',
+                                         4 * max(1, self.workers))
+        self.timeout = app.config.get('HASH_TIMEOUT', 10)
+        # bcrypt makes hashes of at least 4 rounds
+        self.rounds = max(4, app.config.get('BCRYPT_LOG_ROUNDS', 12))
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        app.extensions['hasher'] = self
+
+    @property
+    def pool(self):
+        """The pool of processes, started by the first hash of a process."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # a forked server process needs a pool of its own
+                self._pool = multiprocessing.Pool(self.workers)
+                self._pid = os.getpid()
+            return self._pool
+
+    def run(self, function, *args):
+        """Run `function` in the pool, waiting for its result."""
+        if not self._slots.acquire(False):
+            self.count(rejected=1)
+            raise HasherOverloaded()
+        self.count(submitted=1, pending=1)
+        start = time.time()
+        held = True
+        try:
+            if self.workers:
+                # the slot is held until the hash is done, even when it is
+                # no longer waited for, so that HASH_QUEUE_SIZE bounds the
+                # pool's backlog too
+                pending = self.pool.apply_async(call, (function, args),
+                                                callback=self.release)
+                held = False
+                failed, result = pending.get(self.timeout)
+                if failed:
+                    raise result
+            else:
+                result = function(*args)
+        except multiprocessing.TimeoutError:
+            self.count(failed=1)
+            raise HasherOverloaded()
+        except Exception:
+            self.count(failed=1)
+            raise
+        finally:
+            self.count(seconds=time.time() - start)
+            if held:
+                self.release()
+        self.count(completed=1)
+        return result
+
+    def release(self, result=None):
+        """Free the slot of a hash, once it is done."""
+        self.count(pending=-1)
+        self._slots.release()
+
+    def count(self, **deltas):
+        """Update the counters."""
+        with self._lock:
+            for name, delta in deltas.items():
+                self.counters[name] += delta
+            self.counters['max_pending'] = max(self.counters['max_pending'],
+                                               self.counters['pending'])
+
+    def generate_password_hash(self, password, rounds=None):
+        """Hash a password."""
+        return self.run(generate_password_hash, password,
+                        rounds or self.rounds)
+
+    def check_password_hash(self, pw_hash, password):
+        """Check a password against its hash."""
+        return self.run(check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """Whether a hash was made with other rounds than configured."""
+        return hash_rounds(pw_hash) != self.rounds
+
+    def stats(self):
+        """The counters, with the average time a hash takes."""
+        with self._lock:
+            stats = dict(self.counters)
+        stats['average'] = stats['seconds'] / max(1, stats['completed'])
+        stats['workers'] = self.workers
+        stats['queue_size'] = self.queue_size
+        return stats
+
+
+def hash_rounds(pw_hash):
+    """The log rounds of a bcrypt hash, e.g. 12 for `$2a$12$...`."""
+    if isinstance(pw_hash, bytes):
+        pw_hash = pw_hash.decode('ascii')
+    return int(pw_hash.split('$')[2])
+
+
+def calibrate(target, min_rounds=4, max_rounds=16, repeat=3):
+    """Time bcrypt on this host, from `min_rounds` up.
+
+    Returns the most rounds whose hashes take at most `target` seconds
+    (`min_rounds`, if none does) and the median time of every rounds
+    tried. As each round doubles the time, the first rounds to exceed
+    the target end the calibration.
+    """
+    best, timings = min_rounds, []
+    for rounds in range(min_rounds, max_rounds + 1):
+        times = []
+        for i in range(repeat):
+            start = time.time()
+            generate_password_hash('calibration', rounds)
+            times.append(time.time() - start)
+        median = sorted(times)[len(times) // 2]
+        timings.append((rounds, median))
+        if median > target:
+            break
+        best = rounds
+    return best, timings
+
+
+# The hasher of the current app
+hasher = LocalProxy(lambda: current_app.extensions['hasher'])
@@ -4,7 +4,13 @@
 
 import datetime
 
-from .. import db, bcrypt
+from .. import db
+from .hashing import hasher
+
+
+def normalize_email(email):
+    """The form emails are compared in."""
+    return email.strip().lower()
 
 
 class User(db.Model):
@@ -16,7 +22,8 @@ class User(db.Model):
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50))
     email = db.Column(db.String(255), unique=True, nullable=False)
-    password = db.Column(db.String(255), nullable=False)
+    # only loaded where checked: User.by_email(..., with_password=True)
+    password = db.deferred(db.Column(db.String(255), nullable=False))
     registered_on = db.Column(db.DateTime, nullable=False)
     admin = db.Column(db.Boolean, nullable=False, default=False)
 
@@ -24,10 +31,25 @@ class User(db.Model):
         self.first_name = first_name
         self.last_name = last_name
         self.email = email
-        self.password = bcrypt.generate_password_hash(password)
+        self.password = hasher.generate_password_hash(password)
         self.registered_on = datetime.datetime.now()
         self.admin = admin
 
+    @classmethod
+    def by_id(cls, user_id):
+        """The user of an id, from the session when it is there."""
+        return cls.query.get(user_id)
+
+    @classmethod
+    def by_email(cls, email, with_password=False):
+        """The user of an email, whatever its case, through the
+        normalized email index."""
+        query = cls.query.filter(db.func.lower(cls.email) ==
+                                 normalize_email(email))
+        if with_password:
+            query = query.options(db.undefer('password'))
+        return query.first()
+
     def is_authenticated(self):
         return True
 
@@ -49,3 +71,7 @@ class User(db.Model):
     def __repr__(self):
         return "[{0} {1} id: {2}]".format(self.__class__.__name__,
                                           type(self), self.id)
+
+
+# Emails are unique whatever their case, and looked up by this index
+db.Index('ix_user_email_normalized', db.func.lower(User.email), unique=True)
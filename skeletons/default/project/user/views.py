@@ -3,9 +3,11 @@
 
 from flask import render_template, Blueprint, url_for, redirect, flash, request
 from flask.ext.login import login_user, logout_user, login_required
+from sqlalchemy.exc import IntegrityError
 
-from .. import bcrypt, db
-from .models import User
+from .. import db
+from .hashing import hasher
+from .models import User, normalize_email
 from .forms import LoginForm, RegisterForm
 
 # User blueprint
@@ -24,15 +26,20 @@ def register():
     if form.validate_on_submit():
         user = User(first_name=form.first_name.data,
                     last_name=form.last_name.data,
-                    email=form.email.data,
+                    email=normalize_email(form.email.data),
                     password=form.password.data)
         db.session.add(user)
-        db.session.commit()
-
-        login_user(user)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # registered by an other request since the form was validated
+            db.session.rollback()
+            form.email.errors.append('Email already registered.')
+        else:
+            login_user(user)
 
-        flash('Thank you for registering.', 'success')
-        return redirect(url_for('.dashboard'))
+            flash('Thank you for registering.', 'success')
+            return redirect(url_for('.dashboard'))
 
     return render_template('user/register.html', form=form)
 
@@ -42,9 +49,13 @@ def login():
     """User login view."""
     form = LoginForm(request.form)
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
-        if user and bcrypt.check_password_hash(
-                user.password, request.form['password']):
+        user = User.by_email(form.email.data, with_password=True)
+        password = request.form['password']
+        if user and hasher.check_password_hash(user.password, password):
+            if hasher.needs_rehash(user.password):
+                # BCRYPT_LOG_ROUNDS changed since the password was hashed
+                user.password = hasher.generate_password_hash(password)
+                db.session.commit()
             login_user(user)
             flash('You are logged in. Welcome!', 'success')
             return redirect(url_for('.dashboard'))
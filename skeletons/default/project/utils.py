@@ -4,11 +4,15 @@
 
 """Project utilities."""
 
-from . import app
 from flask.ext.babelex import format_datetime
 
 
-@app.template_filter()
+def init_app(app):
+    """Register the template filters."""
+    app.add_template_filter(datetime_filter)
+    app.add_template_filter(datetime_filter, 'datetime')
+
+
 def datetime_filter(value, fmt='full'):
     """Convert a datetime to a different format."""
     if fmt == 'extend':
@@ -18,5 +22,3 @@ def datetime_filter(value, fmt='full'):
     elif fmt == 'short':
         fmt = "dd.MM.yyyy @ HH:mm"
     return format_datetime(value, fmt)
-
-app.jinja_env.filters['datetime'] = datetime_filter
@@ -13,3 +13,6 @@ os.environ['PYTHONINSPECT'] = "True"
 
 from flask import *
 from project import *
+
+app = create_app()
+app.app_context().push()  # db, without a `with app.app_context()`
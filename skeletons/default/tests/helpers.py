@@ -1 +1,26 @@
 # tests/helpers.py
+
+
+import os
+import tempfile
+
+from project.config import ProductionConfig as BaseProductionConfig
+
+
+def production_config(directory):
+    """ProductionConfig, whose files go into `directory` rather than into
+    the data directory of the project."""
+    return type('ProductionConfig', (BaseProductionConfig,), dict(
+        BCRYPT_CALIBRATION=os.path.join(directory, 'bcrypt.cfg'),
+        METRICS_DIR=os.path.join(directory, 'metrics'),
+        QUERY_PROFILE_DIR=os.path.join(directory, 'queries'),
+        USER_CACHE_DIR=os.path.join(directory, 'cache', 'users'),
+        TEMPLATE_CACHE_DIR=os.path.join(directory, 'cache', 'templates'),
+        RESPONSE_CACHE_DIR=os.path.join(directory, 'cache', 'responses'),
+        FRAGMENT_CACHE_DIR=os.path.join(directory, 'cache', 'fragments')))
+
+
+# For the app started in an other interpreter, as
+# `tests.helpers.ProductionConfig`
+ProductionConfig = production_config(
+    os.environ.get('TEST_DATA_DIR') or tempfile.gettempdir())
@@ -0,0 +1,82 @@
+# tests/test_assets.py
+
+
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from flask.ext.testing import TestCase
+
+from project import create_app
+from project.assets import assets, build, jsmin, minify_css, minify_js
+
+
+class TestMinify(unittest.TestCase):
+
+    def test_minify_css(self):
+        self.assertEqual(minify_css('/* c */\na > b {\n  color: red;\n}\n'),
+                         'a>b{color: red}')
+
+    def test_minify_js(self):
+        self.assertEqual(minify_js('// c\n  var a = 1;\n\n  a += 1;\n'),
+                         'var a = 1;\na += 1;')
+
+    @unittest.skipIf(jsmin, 'rjsmin is installed')
+    def test_minify_js_keeps_multiline_strings(self):
+        for text in ('var a = `\n  // b\n`;\n', 'var a = "\\\n  b";\n'):
+            self.assertEqual(minify_js(text), text)
+
+
+class TestBuild(TestCase):
+
+    def create_app(self):
+        return create_app('project.config.TestingConfig')
+
+    def setUp(self):
+        self.build_dir = tempfile.mkdtemp()
+        self.config = dict(self.app.config)
+        self.app.config.update(
+            ASSETS_BUILD_DIR=self.build_dir,
+            ASSETS_MANIFEST=os.path.join(self.build_dir, 'manifest.json'))
+
+    def tearDown(self):
+        self.app.config.update(self.config)
+        shutil.rmtree(self.build_dir)
+
+    def test_build(self):
+        manifest = build(self.app)
+        self.assertEqual(sorted(manifest['bundles']),
+                         ['base.css', 'base.js', 'main.css', 'main.js',
+                          'user.css'])
+        self.assertIn('user.static:styles/user.css', manifest['files'])
+        path = os.path.join(self.build_dir, os.path.basename(
+            manifest['bundles']['base.css']))
+        with open(path, 'rb') as fd, gzip.open(path + '.gz') as gz:
+            self.assertEqual(fd.read(), gz.read())
+        self.assertTrue(os.path.isfile(self.app.config['ASSETS_MANIFEST']))
+
+    def test_scripts_are_bundled_as_statements(self):
+        with open(os.path.join(self.app.static_folder, 'scripts',
+                               'extra.js'), 'w') as fd:
+            fd.write('var b = 2\n')
+        self.addCleanup(os.remove, os.path.join(
+            self.app.static_folder, 'scripts', 'extra.js'))
+        manifest = build(self.app)
+        path = os.path.join(self.build_dir, os.path.basename(
+            manifest['bundles']['base.js']))
+        with open(path, 'rb') as fd:
+            self.assertIn(b';\nvar b = 2', fd.read())
+
+    def test_unbuilt_urls(self):
+        with self.app.test_request_context():
+            self.assertEqual(assets.bundle_urls('base.css'),
+                             ['/static/styles/base.css'])
+            self.assertEqual(
+                assets.asset_url('static', filename='styles/base.css'),
+                '/static/styles/base.css')
+
+
+if __name__ == '__main__':
+    unittest.main()
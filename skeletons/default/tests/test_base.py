@@ -3,15 +3,14 @@
 
 from flask.ext.testing import TestCase
 
-from project import app, db
+from project import create_app, db
 from project.models import User
 
 
 class BaseTestCase(TestCase):
 
     def create_app(self):
-        app.config.from_object('project.config.TestingConfig')
-        return app
+        return create_app('project.config.TestingConfig')
 
     def setUp(self):
         db.create_all()
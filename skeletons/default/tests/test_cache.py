@@ -0,0 +1,168 @@
+# tests/test_cache.py
+
+
+import time
+import unittest
+
+from flask.ext.testing import TestCase
+
+from project import create_app, db
+from project.cache import (LRUCache, NullCache, fragment_cache,
+                           response_cache)
+from project.user.cache import UserCache
+from project.user.models import User
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(maxsize=2, ttl=0)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats()['hits'], 3)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_items_expire(self):
+        cache = LRUCache(ttl=0.01)
+        cache.set('a', 1)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('a'))
+
+
+class TestUserCache(TestCase):
+
+    def create_app(self):
+        return create_app('project.config.TestingConfig')
+
+    def setUp(self):
+        db.create_all()
+        user = User(first_name='Ad', last_name='Min',
+                    email='ad@min.com', password='admin_user')
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+        self.user_cache = UserCache()
+        self.user_cache.init_app(self.app)
+        self.user_cache.cache = LRUCache()
+        db.session.remove()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_user_is_cached(self):
+        self.assertEqual(self.user_cache.load(self.user_id).email,
+                         'ad@min.com')
+        db.session.remove()
+        user = self.user_cache.load(self.user_id)
+        self.assertEqual(user.email, 'ad@min.com')
+        self.assertEqual(self.user_cache.stats()['hits'], 1)
+        self.assertEqual(self.user_cache.stats()['misses'], 1)
+
+    def test_unknown_user_is_not_cached(self):
+        self.assertIsNone(self.user_cache.load(self.user_id + 1))
+        self.assertIsNone(self.user_cache.load(self.user_id + 1))
+        self.assertEqual(self.user_cache.stats()['hits'], 0)
+
+    def test_update_invalidates(self):
+        user = self.user_cache.load(self.user_id)
+        user.first_name = 'Changed'
+        db.session.commit()
+        db.session.remove()
+        self.assertEqual(self.user_cache.load(self.user_id).first_name,
+                         'Changed')
+        self.assertEqual(self.user_cache.stats()['hits'], 0)
+
+    def test_delete_invalidates(self):
+        db.session.delete(self.user_cache.load(self.user_id))
+        db.session.commit()
+        self.assertIsNone(self.user_cache.load(self.user_id))
+
+    def test_commit_invalidates_again(self):
+        user = self.user_cache.load(self.user_id)
+        user.first_name = 'Changed'
+        db.session.flush()
+        # another request caches the row before the change is committed
+        self.user_cache.cache.set(self.user_id, self.user_cache.snapshot(user))
+        db.session.commit()
+        self.assertIsNone(self.user_cache.cache.get(self.user_id))
+        self.assertNotIn('invalidated_users', db.session.info)
+
+
+class TestResponseCache(TestCase):
+
+    def create_app(self):
+        return create_app('project.config.TestingConfig')
+
+    def setUp(self):
+        response_cache.cache = LRUCache()
+
+    def tearDown(self):
+        response_cache.cache = NullCache()
+
+    def test_response_is_cached(self):
+        first = self.client.get('/')
+        second = self.client.get('/')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(response_cache.stats()['hits'], 1)
+        self.assertTrue(second.headers['ETag'])
+        self.assertTrue(second.headers['Last-Modified'])
+
+    def test_conditional_get(self):
+        etag = self.client.get('/about').headers['ETag']
+        response = self.client.get('/about',
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    def test_flashes_bypass_the_cache(self):
+        with self.client.session_transaction() as session:
+            session['_flashes'] = [('success', 'Flashed!')]
+        self.assertIn(b'Flashed!', self.client.get('/').data)
+        self.assertNotIn(b'Flashed!', self.client.get('/').data)
+        self.assertEqual(response_cache.stats()['misses'], 1)
+
+
+class TestFragmentCache(TestCase):
+
+    def create_app(self):
+        return create_app('project.config.TestingConfig')
+
+    def setUp(self):
+        fragment_cache.cache = LRUCache()
+        fragment_cache.counters.clear()
+
+    def tearDown(self):
+        fragment_cache.cache = NullCache()
+
+    def render(self, value):
+        return self.app.jinja_env.from_string(
+            "{% cache 'test', value, ttl=60 %}{{ value }}-{{ calls.append(1)"
+            " or calls|length }}{% endcache %}").render(value=value,
+                                                       calls=self.calls)
+
+    def test_fragment_is_cached(self):
+        self.calls = []
+        self.assertEqual(self.render('a'), 'a-1')
+        self.assertEqual(self.render('a'), 'a-1')
+        self.assertEqual(self.render('b'), 'b-2')
+        stats = fragment_cache.stats()['test']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_base_fragments(self):
+        self.client.get('/')
+        self.client.get('/about')
+        stats = fragment_cache.stats()
+        self.assertEqual(sorted(stats),
+                         ['footer', 'header', 'scripts', 'styles'])
+        self.assertEqual(stats['header']['hits'], 1)
+        self.assertGreater(stats['header']['saved'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,53 +1,57 @@
 # tests/test_config.py
 
 
+import shutil
+import tempfile
 import unittest
 
 from flask import current_app
 from flask.ext.testing import TestCase
 
-from project import app
+from project import create_app
+from tests.helpers import production_config
 
 
 class TestDevelopmentConfig(TestCase):
 
     def create_app(self):
-        app.config.from_object('project.config.DevelopmentConfig')
-        return app
+        return create_app('project.config.DevelopmentConfig')
 
     def test_app_is_development(self):
-        self.assertFalse(current_app.config['TESTING'] is False)
-        self.assertTrue(app.config['DEBUG'] is True)
-        self.assertTrue(app.config['WTF_CSRF_ENABLED'] is False)
-        self.assertTrue(app.config['DEBUG_TB_ENABLED'] is True)
+        self.assertFalse(current_app.config['TESTING'])
+        self.assertTrue(self.app.config['DEBUG'] is True)
+        self.assertTrue(self.app.config['WTF_CSRF_ENABLED'] is False)
+        self.assertTrue(self.app.config['DEBUG_TB_ENABLED'] is True)
         self.assertFalse(current_app is None)
 
 
 class TestTestingConfig(TestCase):
 
     def create_app(self):
-        app.config.from_object('project.config.TestingConfig')
-        return app
+        return create_app('project.config.TestingConfig')
 
     def test_app_is_testing(self):
         self.assertTrue(current_app.config['TESTING'])
-        self.assertTrue(app.config['DEBUG'] is True)
-        self.assertTrue(app.config['BCRYPT_LOG_ROUNDS'] == 1)
-        self.assertTrue(app.config['WTF_CSRF_ENABLED'] is False)
+        self.assertTrue(self.app.config['DEBUG'] is True)
+        self.assertTrue(self.app.config['BCRYPT_LOG_ROUNDS'] == 1)
+        self.assertTrue(self.app.config['WTF_CSRF_ENABLED'] is False)
 
 
 class TestProductionConfig(TestCase):
 
     def create_app(self):
-        app.config.from_object('project.config.ProductionConfig')
-        return app
+        self.directory = tempfile.mkdtemp()
+        return create_app(production_config(self.directory))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
 
     def test_app_is_production(self):
-        self.assertFalse(current_app.config['TESTING'] is False)
-        self.assertTrue(app.config['DEBUG'] is False)
-        self.assertTrue(app.config['DEBUG_TB_ENABLED'] is False)
-        self.assertTrue(app.config['WTF_CSRF_ENABLED'] is True)
-        self.assertTrue(app.config['BCRYPT_LOG_ROUNDS'] == 13)
+        self.assertFalse(current_app.config['TESTING'])
+        self.assertTrue(self.app.config['DEBUG'] is False)
+        self.assertTrue(self.app.config['DEBUG_TB_ENABLED'] is False)
+        self.assertTrue(self.app.config['WTF_CSRF_ENABLED'] is True)
+        self.assertTrue(self.app.config['BCRYPT_LOG_ROUNDS'] == 13)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,71 @@
+# tests/test_database.py
+
+
+import unittest
+
+from flask.ext.testing import TestCase
+from sqlalchemy import create_engine
+
+from project import create_app
+from project.config import TestingConfig
+from project.database import TimedQueuePool, pool_stats
+
+
+class TestPoolStats(unittest.TestCase):
+
+    def test_checkouts_are_timed(self):
+        engine = create_engine('sqlite://', poolclass=TimedQueuePool,
+                               pool_size=1, max_overflow=0)
+        connection = engine.connect()
+        stats = pool_stats(engine)
+        self.assertEqual(stats['checked_out'], 1)
+        self.assertEqual(stats['checkouts'], 1)
+        connection.close()
+        self.assertEqual(pool_stats(engine)['checked_out'], 0)
+
+
+class TestPoolStatsView(TestCase):
+
+    def create_app(self):
+        return create_app('project.config.TestingConfig')
+
+    def test_allowed_client(self):
+        response = self.client.get(
+            '/_stats/pool', environ_base={'REMOTE_ADDR': '127.0.0.1'})
+        self.assert200(response)
+        self.assertIn('pool', response.json)
+
+    def test_other_client(self):
+        response = self.client.get(
+            '/_stats/pool', environ_base={'REMOTE_ADDR': '10.0.0.1'})
+        self.assert404(response)
+
+    def test_forwarded_request(self):
+        # any client, through a proxy on the same host
+        response = self.client.get(
+            '/_stats/pool', environ_base={'REMOTE_ADDR': '127.0.0.1'},
+            headers={'X-Forwarded-For': '10.0.0.1'})
+        self.assert404(response)
+
+
+class ProxiedConfig(TestingConfig):
+    PROXY_COUNT = 1
+
+
+class TestPoolStatsViewBehindProxy(TestCase):
+
+    def create_app(self):
+        return create_app(ProxiedConfig)
+
+    def test_forwarded_request(self):
+        # the proxy adds the client's address to what the client sent
+        for client, status in (('10.0.0.1', 404), ('127.0.0.1', 200),
+                               ('127.0.0.1, 10.0.0.1', 404)):
+            response = self.client.get(
+                '/_stats/pool', environ_base={'REMOTE_ADDR': '10.0.0.2'},
+                headers={'X-Forwarded-For': client})
+            self.assertEqual(response.status_code, status, client)
+
+
+if __name__ == '__main__':
+    unittest.main()
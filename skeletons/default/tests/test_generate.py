@@ -0,0 +1,44 @@
+# tests/test_generate.py
+
+
+import unittest
+
+from flask.ext.testing import TestCase
+
+from project import create_app, db
+from project.user.generate import generate_users
+from project.user.hashing import hasher
+from project.user.models import User
+
+
+class TestGenerateUsers(TestCase):
+
+    def create_app(self):
+        return create_app('project.config.TestingConfig')
+
+    def setUp(self):
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_users_are_inserted_in_batches(self):
+        progress = list(generate_users(25, batch=10, same_password=True))
+        self.assertEqual(progress, [10, 20, 25])
+        self.assertEqual(User.query.count(), 25)
+        user = User.query.first()
+        self.assertTrue(hasher.check_password_hash(user.password,
+                                                   'password'))
+
+    def test_users_are_appended(self):
+        list(generate_users(3, seed=1))
+        list(generate_users(3, seed=1))
+        self.assertEqual(db.session.query(User.email).distinct().count(), 6)
+        user = User.query.get(5)
+        self.assertTrue(hasher.check_password_hash(user.password,
+                                                   'password5'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# tests/test_hashing.py
+
+
+import threading
+import time
+import unittest
+
+from flask import Flask
+
+from project.user.hashing import (PasswordHasher, HasherOverloaded,
+                                   calibrate, hash_rounds)
+
+
+def make_hasher(**config):
+    app = Flask(__name__)
+    app.config.update(BCRYPT_LOG_ROUNDS=4, **config)
+    return PasswordHasher(app)
+
+
+class TestPasswordHasher(unittest.TestCase):
+
+    def test_hash_in_the_pool(self):
+        hasher = make_hasher(HASH_WORKERS=1)
+        pw_hash = hasher.generate_password_hash('secret')
+        self.assertTrue(hasher.check_password_hash(pw_hash, 'secret'))
+        self.assertFalse(hasher.check_password_hash(pw_hash, 'wrong'))
+        self.assertEqual(hasher.stats()['completed'], 3)
+        self.assertEqual(hasher.stats()['pending'], 0)
+
+    def test_hash_inline(self):
+        hasher = make_hasher(HASH_WORKERS=0)
+        pw_hash = hasher.generate_password_hash('secret')
+        self.assertTrue(hasher.check_password_hash(pw_hash, 'secret'))
+
+    def test_overload_is_refused(self):
+        hasher = make_hasher(HASH_WORKERS=0, HASH_QUEUE_SIZE=1)
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait()
+
+        thread = threading.Thread(target=hasher.run, args=(slow,))
+        thread.start()
+        started.wait()
+        try:
+            self.assertRaises(HasherOverloaded,
+                              hasher.generate_password_hash, 'secret')
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(hasher.stats()['rejected'], 1)
+        hasher.generate_password_hash('secret')
+
+    def test_timed_out_hash_holds_its_slot(self):
+        hasher = make_hasher(HASH_WORKERS=1, HASH_QUEUE_SIZE=1,
+                             HASH_TIMEOUT=0.1)
+        self.assertRaises(HasherOverloaded, hasher.run, time.sleep, 1)
+        self.assertRaises(HasherOverloaded,
+                          hasher.generate_password_hash, 'secret')
+        self.assertEqual(hasher.stats()['rejected'], 1)
+        time.sleep(1.5)
+        self.assertEqual(hasher.stats()['pending'], 0)
+        hasher.generate_password_hash('secret')
+
+    def test_hash_failure_is_raised(self):
+        hasher = make_hasher(HASH_WORKERS=1)
+        self.assertRaises(ValueError, hasher.check_password_hash,
+                          'not a hash', 'secret')
+        self.assertEqual(hasher.stats()['failed'], 1)
+        self.assertEqual(hasher.stats()['pending'], 0)
+
+    def test_needs_rehash(self):
+        hasher = make_hasher(HASH_WORKERS=0)
+        pw_hash = hasher.generate_password_hash('secret', 5)
+        self.assertEqual(hash_rounds(pw_hash), 5)
+        self.assertTrue(hasher.needs_rehash(pw_hash))
+        self.assertFalse(hasher.needs_rehash(
+            hasher.generate_password_hash('secret')))
+
+
+class TestCalibrate(unittest.TestCase):
+
+    def test_calibration_stops_above_target(self):
+        rounds, timings = calibrate(0, 4, 16, repeat=1)
+        self.assertEqual(rounds, 4)
+        self.assertEqual(len(timings), 1)
+
+    def test_calibration_stops_at_max(self):
+        rounds, timings = calibrate(60, 4, 5, repeat=1)
+        self.assertEqual(rounds, 5)
+        self.assertEqual([tried for tried, seconds in timings], [4, 5])
+
+
+if __name__ == '__main__':
+    unittest.main()
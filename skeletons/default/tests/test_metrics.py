@@ -0,0 +1,152 @@
+# tests/test_metrics.py
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from flask.ext.testing import TestCase
+
+from project import create_app, db
+from project.metrics import (Histogram, clear_directory, metrics,
+                             retire_process)
+from project.user.models import User
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram('latency', 'Latency.', ('endpoint',),
+                              (0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(('home',), value)
+        self.assertEqual(list(histogram.samples(
+            ('home',), histogram.rows[('home',)])), [
+            'latency_bucket{endpoint="home",le="0.1"} 2',
+            'latency_bucket{endpoint="home",le="1.0"} 3',
+            'latency_bucket{endpoint="home",le="+Inf"} 4',
+            'latency_sum{endpoint="home"} 2.65',
+            'latency_count{endpoint="home"} 4'])
+
+
+class TestMetrics(TestCase):
+
+    def create_app(self):
+        return create_app('project.config.TestingConfig')
+
+    def setUp(self):
+        db.create_all()
+        metrics.reset()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def rows(self, name):
+        return metrics.snapshot()[name]
+
+    def test_requests_are_measured(self):
+        self.client.get('/about')
+        self.client.get('/about')
+        self.client.get('/nowhere')
+        self.assertEqual(self.rows('http_requests_total'), {
+            ('main.about', 'GET', 200): [2], ('none', 'GET', 404): [1]})
+        size = self.rows('http_response_size_bytes')[('main.about',)]
+        self.assertEqual(size[-1], 2)
+        self.assertGreater(size[-2], 0)
+        template = self.rows('template_render_duration_seconds')
+        self.assertGreater(template[('main.about',)][-2], 0)
+
+    def test_queries_are_counted(self):
+        db.session.add(User(first_name='Ad', last_name='Min',
+                            email='ad@min.com', password='admin_user'))
+        db.session.commit()
+        self.client.post('/user/login', data=dict(
+            email='ad@min.com', password='wrong'))
+        queries = self.rows('db_queries_per_request')[('user.login',)]
+        self.assertEqual(queries[-1], 1)
+        self.assertGreaterEqual(queries[-2], 1)
+
+    def test_queries_are_timed_once(self):
+        seconds = []
+        profiler = self.app.extensions['profiler']
+        profiler.reset()
+        record = profiler.record_query
+        profiler.record_query = lambda statement, time: (
+            seconds.append(time), record(statement, time))
+        try:
+            self.client.post('/user/login', data=dict(
+                email='ad@min.com', password='wrong'))
+        finally:
+            del profiler.record_query
+        # the request metrics add up the same times as the profiler
+        sql = self.rows('db_query_duration_seconds')[('user.login',)]
+        self.assertEqual(sql[-2], sum(seconds))
+        self.assertEqual(self.rows('db_queries_per_request')[
+            ('user.login',)][-2], len(seconds))
+        self.assertGreaterEqual(len(seconds), 1)
+
+    def test_metrics_page(self):
+        self.client.get('/about')
+        response = self.client.get(
+            '/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('text/plain', response.content_type)
+        self.assertIn(b'# TYPE http_request_duration_seconds histogram',
+                      response.data)
+        self.assertIn(b'http_request_duration_seconds_count'
+                      b'{endpoint="main.about"} 1', response.data)
+
+    def test_metrics_page_is_restricted(self):
+        response = self.client.get(
+            '/metrics', environ_base={'REMOTE_ADDR': '10.0.0.1'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_metrics_page_is_restricted_behind_proxy(self):
+        response = self.client.get(
+            '/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'},
+            headers={'X-Forwarded-For': '10.0.0.1'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_processes_are_added_up(self):
+        directory = tempfile.mkdtemp()
+        try:
+            metrics.directory = directory
+            self.client.get('/about')
+            metrics.flush()
+            with open(metrics.filename()) as fd:
+                data = fd.read()
+            with open(metrics.filename().replace('.json', '0.json'),
+                      'w') as fd:
+                fd.write(data)
+            rows = metrics.collect()['http_requests_total']
+            self.assertEqual(rows[('main.about', 'GET', 200)], [2])
+        finally:
+            metrics.directory = None
+            shutil.rmtree(directory)
+
+    def test_exited_processes_are_added_up(self):
+        directory = tempfile.mkdtemp()
+        try:
+            metrics.directory = directory
+            self.client.get('/about')
+            metrics.flush()
+            # two processes of pid 1 exit, one after the other
+            for i in range(2):
+                shutil.copy(metrics.filename(),
+                            os.path.join(directory, 'metrics-1.json'))
+                retire_process(directory, 1)
+            self.assertFalse(os.path.exists(
+                os.path.join(directory, 'metrics-1.json')))
+            rows = metrics.collect()['http_requests_total']
+            self.assertEqual(rows[('main.about', 'GET', 200)], [3])
+            clear_directory(directory)
+            self.assertEqual(os.listdir(directory), [])
+        finally:
+            metrics.directory = None
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# tests/test_models.py
+
+
+import unittest
+
+from flask.ext.testing import TestCase
+from sqlalchemy.exc import IntegrityError
+
+from project import create_app, db
+from project.user.models import User
+
+
+class TestUserLookups(TestCase):
+
+    def create_app(self):
+        return create_app('project.config.TestingConfig')
+
+    def setUp(self):
+        db.create_all()
+        db.session.add(User(first_name='Ad', last_name='Min',
+                            email='Ad@Min.com', password='admin_user'))
+        db.session.commit()
+        db.session.remove()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_by_email_ignores_case(self):
+        user = User.by_email(' ad@MIN.com')
+        self.assertEqual(user.email, 'Ad@Min.com')
+        self.assertIn('password', db.inspect(user).unloaded)
+
+    def test_by_email_with_password(self):
+        user = User.by_email('ad@min.com', with_password=True)
+        self.assertNotIn('password', db.inspect(user).unloaded)
+
+    def test_by_id_defers_password(self):
+        user = User.by_id(1)
+        self.assertIn('password', db.inspect(user).unloaded)
+        self.assertTrue(user.password)
+
+    def test_emails_are_unique_whatever_their_case(self):
+        db.session.add(User(first_name='Ad', last_name='Min',
+                            email='ad@min.com', password='admin_user'))
+        self.assertRaises(IntegrityError, db.session.commit)
+
+    def test_register_an_email_in_an_other_case(self):
+        response = self.client.post('/user/register', data=dict(
+            first_name='Ad', last_name='Min', email=' AD@min.com',
+            password='admin_user', confirm='admin_user'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Email already registered.', response.data)
+        self.assertEqual(User.query.count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
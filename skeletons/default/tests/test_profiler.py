@@ -0,0 +1,126 @@
+# tests/test_profiler.py
+
+
+import shutil
+import tempfile
+import unittest
+
+from flask.ext.testing import TestCase
+
+from project import create_app, db
+from project.profiler import (fingerprint, load_profiles, percentile,
+                              profiler, report)
+from project.user.models import User
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def test_values_are_replaced(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM user  WHERE email = 'a@b.c'\n"
+                        "AND id > 12 LIMIT 1 -- comment"),
+            'SELECT * FROM user WHERE email = ? AND id > ? LIMIT ?')
+
+    def test_parameters_are_replaced(self):
+        for statement in ('SELECT a FROM t WHERE b = %(b_1)s',
+                          'SELECT a FROM t WHERE b = %s',
+                          'SELECT a FROM t WHERE b = :b_1',
+                          'SELECT a FROM t WHERE b = ?'):
+            self.assertEqual(fingerprint(statement),
+                             'SELECT a FROM t WHERE b = ?')
+
+    def test_lists_are_collapsed(self):
+        self.assertEqual(fingerprint('SELECT a FROM t WHERE b IN (?, ?, ?)'),
+                         fingerprint('SELECT a FROM t WHERE b IN (?)'))
+        self.assertEqual(
+            fingerprint('INSERT INTO t (a, b) VALUES (?, ?), (?, ?), (?, ?)'),
+            'INSERT INTO t (a, b) VALUES (?)')
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 95), 95)
+        self.assertEqual(percentile([], 95), 0.0)
+
+
+class Logger(object):
+
+    def __init__(self):
+        self.warnings = []
+
+    def warning(self, message, *args):
+        self.warnings.append(message % args)
+
+
+class TestProfiler(TestCase):
+
+    def create_app(self):
+        app = create_app('project.config.TestingConfig')
+
+        @app.route('/_test/users')
+        def users():
+            # one query per user: an N+1
+            return ','.join(User.by_id(user_id).first_name
+                            for user_id in range(1, 7))
+        return app
+
+    def setUp(self):
+        db.create_all()
+        for i in range(6):
+            db.session.add(User(first_name='User{0}'.format(i), last_name='',
+                                email='user{0}@example.com'.format(i),
+                                password='password'))
+        db.session.commit()
+        db.session.remove()
+        profiler.reset()
+        self.logger = profiler.logger
+        profiler.logger = Logger()
+
+    def tearDown(self):
+        profiler.logger = self.logger
+        db.session.remove()
+        db.drop_all()
+
+    def test_n_plus_one_is_flagged(self):
+        self.client.get('/_test/users')
+        stats = profiler.endpoints['users']['queries']
+        self.assertEqual(stats.count, 1)
+        self.assertGreaterEqual(stats.total, 6)
+        flagged = [key for key, query in profiler.queries.items()
+                   if query['n_plus_one']]
+        self.assertEqual(len(flagged), 1)
+        self.assertIn('FROM user', flagged[0])
+        self.assertTrue(profiler.logger.warnings[0].startswith(
+            'Likely N+1, 6 times on /_test/users'))
+
+    def test_slow_queries_are_logged(self):
+        profiler.slow_threshold = 0
+        try:
+            self.client.get('/_test/users')
+        finally:
+            profiler.slow_threshold = 0.5
+        self.assertTrue(profiler.logger.warnings[0].startswith(
+            'Slow query'))
+
+    def test_report(self):
+        self.client.get('/_test/users')
+        self.client.get('/_test/users')
+        directory = tempfile.mkdtemp()
+        try:
+            profiler.directory = directory
+            profiler.flush()
+            queries, endpoints = load_profiles(directory)
+        finally:
+            profiler.directory = None
+            shutil.rmtree(directory)
+        self.assertEqual(endpoints['users']['queries']['count'], 2)
+        query = [query for query in queries.values()
+                 if query['n_plus_one']][0]
+        self.assertEqual(query['n_plus_one'], 2)
+        self.assertEqual(query['count'], 12)
+        lines = report(queries, endpoints, limit=5)
+        self.assertIn('users', '\n'.join(lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
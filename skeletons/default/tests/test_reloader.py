@@ -0,0 +1,63 @@
+# tests/test_reloader.py
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from flask.ext.testing import TestCase
+
+from project import create_app, reloader
+from project.reloader import InotifyReloaderLoop, load_libc
+
+
+@unittest.skipUnless(load_libc(), 'needs inotify')
+class TestInotifyReloader(TestCase):
+
+    def create_app(self):
+        return create_app('project.config.TestingConfig')
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.root, 'templates'))
+        self.loop = InotifyReloaderLoop()
+        self.loop.root = self.root
+        self.loop.start()
+        reloader.init_app(self.app)
+
+    def tearDown(self):
+        os.close(self.loop.fd)
+        reloader.apps.remove(self.app)
+        shutil.rmtree(self.root)
+
+    def write(self, *path):
+        with open(os.path.join(self.root, *path), 'w') as fd:
+            fd.write('changed')
+        return os.path.join(self.root, *path)
+
+    def test_burst_of_changes(self):
+        paths = set(self.write('templates', name)
+                    for name in ('a.html', 'b.html', 'c.txt'))
+        self.assertEqual(self.loop.wait(), paths)
+
+    def test_new_directories_are_watched(self):
+        os.mkdir(os.path.join(self.root, 'blueprint'))
+        self.loop.read_events(0.5)
+        path = self.write('blueprint', 'views.py')
+        self.assertEqual(self.loop.wait(), set([path]))
+
+    def test_templates_are_reloaded_in_place(self):
+        self.app.jinja_env.get_template('_base.html')
+        self.assertTrue(self.app.jinja_env.cache)
+        self.loop.handle(set([self.write('templates', 'a.html')]))
+        self.assertFalse(self.app.jinja_env.cache)
+
+    def test_code_restarts(self):
+        with self.assertRaises(SystemExit) as raised:
+            self.loop.handle(set([self.write('views.py')]))
+        self.assertEqual(raised.exception.code, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
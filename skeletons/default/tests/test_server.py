@@ -0,0 +1,91 @@
+# tests/test_server.py
+
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import unittest
+
+try:
+    from urllib.request import urlopen
+except ImportError:  # Python 2
+    from urllib2 import urlopen
+
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('localhost', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+class TestSupervisor(unittest.TestCase):
+
+    def setUp(self):
+        self.port = free_port()
+        self.log = open(os.devnull, 'w')
+        self.process = subprocess.Popen(
+            [sys.executable, 'run', '-c', 'test', '-p', str(self.port),
+             '-w', '2', '-t', '2'], cwd=basedir, stdout=self.log,
+            stderr=self.log)
+        self.workers = self.wait_for_workers(2)
+
+    def tearDown(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.log.close()
+
+    def wait_for_workers(self, count, timeout=10):
+        """The pids of the workers, once `count` of them serve."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            out = subprocess.Popen(
+                ['ps', '-o', 'pid=', '--ppid', str(self.process.pid)],
+                stdout=subprocess.PIPE).communicate()[0]
+            workers = set(int(pid) for pid in out.split())
+            if len(workers) == count:
+                try:
+                    self.get('/')
+                    return workers
+                except IOError:
+                    pass
+            time.sleep(0.2)
+        self.fail('{0} workers did not start'.format(count))
+
+    def get(self, path):
+        return urlopen('http://localhost:{0}{1}'.format(self.port, path))
+
+    def test_serves(self):
+        for i in range(10):
+            self.assertEqual(self.get('/about').getcode(), 200)
+
+    def test_dead_worker_is_replaced(self):
+        dead = sorted(self.workers)[0]
+        os.kill(dead, signal.SIGKILL)
+        time.sleep(1)
+        workers = self.wait_for_workers(2)
+        self.assertNotIn(dead, workers)
+
+    def test_reload_and_stop(self):
+        self.process.send_signal(signal.SIGHUP)
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            workers = self.wait_for_workers(2)
+            if not workers & self.workers:
+                break
+            time.sleep(0.2)
+        self.assertFalse(workers & self.workers)
+        self.process.send_signal(signal.SIGTERM)
+        self.assertEqual(self.process.wait(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# tests/test_startup.py
+
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from project import create_app
+from project.user.cache import user_cache
+from project.user.hashing import hasher
+from tests.helpers import production_config
+
+basedir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestStartup(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_second_app(self):
+        testing = create_app('project.config.TestingConfig')
+        production = create_app(production_config(self.directory))
+        self.assertTrue(testing.config['TESTING'])
+        self.assertFalse(production.config['TESTING'])
+        self.assertEqual(
+            [name for name, seconds in testing.extensions['startup']],
+            ['config', 'extensions', 'caches', 'metrics', 'blueprints',
+             'handlers', 'templates'])
+        # the testing app is not configured by the production one
+        with testing.app_context():
+            self.assertEqual(hasher.rounds, 4)
+            self.assertEqual(hasher.workers, 0)
+            self.assertEqual(user_cache.stats()['misses'], 0)
+            self.assertNotIn('maxsize', user_cache.stats())
+        with production.app_context():
+            self.assertEqual(hasher.rounds, 13)
+            self.assertEqual(user_cache.stats()['maxsize'], 1024)
+        self.assertIs(testing.extensions['assets'].app, testing)
+        self.assertIsNone(testing.extensions['profiler'].directory)
+        self.assertIs(testing.jinja_env.fragment_cache,
+                      testing.extensions['fragment_cache'])
+
+    def test_cold_start_is_within_budget(self):
+        env = dict(os.environ, TEST_DATA_DIR=self.directory)
+        out = subprocess.check_output(
+            [sys.executable, os.path.join('benchmarks', 'bench_startup.py'),
+             '--config', 'tests.helpers.ProductionConfig', '--json'],
+            cwd=basedir, env=env, universal_newlines=True)
+        timings = json.loads(out)
+        self.assertLess(timings['total'], timings['budget'], out)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+# tests/test_templating.py
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from flask.ext.testing import TestCase
+
+from project import create_app
+from project.templating import BytecodeCache, template_names, warm_up
+
+
+class TestTemplating(TestCase):
+
+    def create_app(self):
+        return create_app('project.config.TestingConfig')
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.bytecode_cache = self.app.jinja_env.bytecode_cache
+        self.app.jinja_env.bytecode_cache = BytecodeCache(self.cache_dir)
+        self.app.jinja_env.cache.clear()
+
+    def tearDown(self):
+        self.app.jinja_env.bytecode_cache = self.bytecode_cache
+        shutil.rmtree(self.cache_dir)
+
+    def test_template_names(self):
+        names = template_names(self.app)
+        self.assertIn('_base.html', names)
+        self.assertIn('main/home.html', names)
+        self.assertIn('user/login.html', names)
+        self.assertNotIn('bootstrap/base.html', names)
+
+    def test_warm_up_fills_the_bytecode_cache(self):
+        count, seconds = warm_up(self.app)
+        self.assertEqual(count, len(template_names(self.app)))
+        self.assertEqual(len(os.listdir(self.cache_dir)), count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+# tests/test_scaffold.py
+
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+import scaffold  # noqa: E402
+
+
+class ScaffoldTestCase(unittest.TestCase):
+    """In a skeletons directory and a cache directory of its own."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.saved = scaffold.skeletons_root, scaffold.cache_dir
+        scaffold.skeletons_root = os.path.join(self.directory, 'skeletons')
+        scaffold.cache_dir = os.path.join(self.directory, 'cache')
+        os.makedirs(scaffold.skeletons_root)
+
+    def tearDown(self):
+        scaffold.skeletons_root, scaffold.cache_dir = self.saved
+        shutil.rmtree(self.directory)
+
+    def write(self, relpath, text):
+        path = os.path.join(scaffold.skeletons_root, relpath)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as fd:
+            fd.write(text)
+
+
+class TestSkeletonSource(ScaffoldTestCase):
+
+    def setUp(self):
+        ScaffoldTestCase.setUp(self)
+        self.write('sk/project.prj', '')
+        self.write('sk/x/b.cfg', 'p={{ skeleton }}\n')
+        self.write('sk/.render', 'x/b.cfg\n')
+        os.makedirs(os.path.join(scaffold.skeletons_root, 'sk', 'empty'))
+        self.skeleton_dir = os.path.join(scaffold.skeletons_root, 'sk')
+        self.pack = self.skeleton_dir + scaffold.pack_suffix
+        scaffold.SkeletonPack.build(self.skeleton_dir, self.pack)
+
+    def source(self):
+        return scaffold.skeleton_source('sk', scaffold.load_skeleton_index())
+
+    def test_pack_is_used_when_up_to_date(self):
+        self.assertEqual(self.source(), self.pack)
+
+    def test_edited_file(self):
+        self.source()
+        with open(os.path.join(self.skeleton_dir, 'x', 'b.cfg'), 'a') as fd:
+            fd.write('q=1\n')
+        self.assertEqual(self.source(), self.skeleton_dir)
+
+    def test_edited_render_manifest(self):
+        self.source()
+        self.write('sk/.render', '# nothing rendered in place\n')
+        self.assertEqual(self.source(), self.skeleton_dir)
+
+    def test_removed_directory(self):
+        self.source()
+        os.rmdir(os.path.join(self.skeleton_dir, 'empty'))
+        self.assertEqual(self.source(), self.skeleton_dir)
+
+
+
+class TestBytecodeCache(ScaffoldTestCase):
+
+    def test_bytecode_is_written_whole(self):
+        directory = os.path.join(scaffold.cache_dir, 'jinja')
+        self.write('t/a.txt', 'p={{ skeleton }}')
+        env = scaffold.jinja2.Environment(
+            loader=scaffold.jinja2.FileSystemLoader(scaffold.skeletons_root),
+            bytecode_cache=scaffold.BytecodeCache(directory))
+        self.assertFalse(os.path.exists(directory))
+        self.assertEqual(env.get_template('t/a.txt').render(skeleton='x'),
+                         'p=x')
+        names = os.listdir(directory)
+        self.assertEqual(len(names), 1)
+        self.assertTrue(names[0].endswith('.cache'), names)
+        # a second environment loads the bytecode written by the first
+        other = scaffold.jinja2.Environment(
+            loader=env.loader, bytecode_cache=env.bytecode_cache)
+        self.assertEqual(other.get_template('t/a.txt').render(skeleton='y'),
+                         'p=y')
+
+
+
+@unittest.skipIf(os.name != 'posix', 'pip is stubbed by a shell script')
+class TestWheelhouse(ScaffoldTestCase):
+
+    def setUp(self):
+        ScaffoldTestCase.setUp(self)
+        self.bin = os.path.join(self.directory, 'bin')
+        self.requirements = os.path.join(self.directory, 'requirements.txt')
+        with open(self.requirements, 'w') as fd:
+            fd.write('Flask==0.10.1\n')
+
+    def stub_pip(self, status):
+        """A pip whose `wheel` writes a wheel, then exits with `status`."""
+        os.makedirs(self.bin)
+        path = os.path.join(self.bin, 'pip')
+        with open(path, 'w') as fd:
+            fd.write('#!/bin/sh\n'
+                     'if [ "$1" = wheel ]; then\n'
+                     '  mkdir -p "$3" && touch "$3/Flask.whl"\n'
+                     '  exit {0}\n'
+                     'fi\n'.format(status))
+        os.chmod(path, 0o755)
+
+    def build(self):
+        wheelhouse = scaffold.wheelhouse_dir('3.6', self.requirements)
+        steps = scaffold.wheelhouse_steps(self.bin, '3.6', self.requirements,
+                                          install=False)
+        with open(os.devnull, 'w') as devnull, \
+                scaffold.redirect_stdout(devnull):
+            result, = scaffold.run_steps(steps)
+        return result, wheelhouse
+
+    def test_build(self):
+        self.stub_pip(0)
+        result, wheelhouse = self.build()
+        self.assertEqual(result.status, 'ok')
+        self.assertEqual(os.listdir(os.path.dirname(wheelhouse)),
+                         [os.path.basename(wheelhouse)])
+        self.assertTrue(os.path.isfile(os.path.join(wheelhouse,
+                                                    'Flask.whl')))
+
+    def test_failed_build_is_removed(self):
+        self.stub_pip(1)
+        result, wheelhouse = self.build()
+        self.assertEqual(result.status, 'failed')
+        self.assertEqual(os.listdir(os.path.dirname(wheelhouse)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()